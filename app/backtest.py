@@ -0,0 +1,390 @@
+import pandas as pd
+import numpy as np
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import forecast
+import feature_store
+import batch_forecast
+import model_store
+import instrument
+
+# Директория результатов кросс-проверки и кэш прогнозов по срезам
+backtest_dir = os.path.join(forecast.output_dir, "backtest")
+cache_dir = os.path.join(backtest_dir, "cache")
+
+# Срезы по умолчанию: не меньше года истории для обучения, прогноз на 90 дней,
+# новый срез каждые 45 дней (отсчёт от конца данных, как в Prophet cross_validation)
+default_initial = 365
+default_horizon = 90
+default_period = 45
+
+# Настройки пакетной модели, которые можно менять через --param
+batch_settings = batch_forecast.setting_names
+
+# Общие для всех задач данные: ряды вида (Станция, Показатель):(даты, значения),
+# внешние признаки вида (Станция, Срез):DataFrame, настройки модели и горизонт.
+# Заполняются в backtest() до запуска пула процессов и наследуются дочерними
+# процессами при fork без копирования на каждую задачу
+shared = {}
+
+
+def make_cutoffs(dates, initial=default_initial, horizon=default_horizon, period=default_period):
+    """
+    Возвращает даты срезов (последний день обучения) по всему периоду\n
+    данных: от конца данных минус горизонт назад с шагом period, пока\n
+    до начала данных остаётся не меньше initial дней.
+
+    Аргументы:
+        dates (pd.Series): Даты данных.
+        initial (int): Минимальная длина обучения, дней.
+        horizon (int): Горизонт прогноза, дней.
+        period (int): Шаг между срезами, дней.
+    """
+    start, end = dates.min(), dates.max()
+    cutoffs = []
+    cutoff = end - pd.Timedelta(days=horizon)
+    while cutoff - start >= pd.Timedelta(days=initial):
+        cutoffs.append(cutoff)
+        cutoff -= pd.Timedelta(days=period)
+    return sorted(cutoffs)
+
+def setting_names(engine):
+    """
+    Возвращает имена настроек модели, которые можно менять через --param:\n
+    для Prophet - аргументы Prophet(), для пакетной модели - batch_settings.
+    """
+    if engine == 'batch':
+        return list(batch_settings)
+    from prophet import Prophet
+    return [name for name in inspect.signature(Prophet.__init__).parameters if name != 'self']
+
+def unknown_settings(engine, params):
+    """
+    Возвращает имена из params, которых нет среди настроек модели.
+    """
+    names = setting_names(engine)
+    return [name for name in (params or {}) if name not in names]
+
+def model_config(engine, params=None):
+    """
+    Возвращает настройки модели, от которых зависит прогноз: для Prophet -\n
+    параметры forecast.prophet_params (интервалы не считаются), для\n
+    пакетной модели - настройки batch_forecast. params переопределяют их.\n
+    Неизвестные настройки - ValueError до обучения срезов.
+    """
+    unknown = unknown_settings(engine, params)
+    if unknown:
+        raise ValueError(f"Неизвестные настройки модели {engine}: {unknown}. Доступны: {setting_names(engine)}.")
+    if engine == 'batch':
+        return batch_forecast.model_settings(params)
+    config = {**forecast.prophet_params, 'uncertainty_samples': 0}
+    config.update(params or {})
+    return config
+
+def fold_key(engine, station, target, cutoff, horizon, config, train_hash):
+    """
+    Возвращает ключ кэша среза: sha256 от модели, настроек, пары,\n
+    среза, горизонта и обучающего ряда (model_store.series_hash, для\n
+    Prophet - вместе с признаками обучения и горизонта, для пакетной\n
+    модели - вместе с границами общей сетки дат).
+    """
+    payload = json.dumps([engine, config, station, target, str(cutoff), horizon, train_hash],
+                         sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _cache_path(key):
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+def _train_size(station, target, cutoff):
+    ds, _ = shared['series'][(station, target)]
+    return int(np.searchsorted(ds, np.datetime64(cutoff), side='right'))
+
+def _test_dates(cutoff):
+    return pd.date_range(cutoff + pd.Timedelta(days=1), periods=shared['horizon'], freq='D')
+
+def fold_frames(station, target, cutoff):
+    """
+    Возвращает обучающий ряд пары до среза и даты горизонта в формате\n
+    Prophet. Если для среза есть внешние признаки (рассчитанные только по\n
+    данным до среза), они добавляются столбцами, как в forecast.py.
+    """
+    ds, y = shared['series'][(station, target)]
+    n_train = _train_size(station, target, cutoff)
+    features = shared['features'].get((station, cutoff))
+    train = forecast.future_frame(ds[:n_train], features).assign(y=y[:n_train])
+    future = forecast.future_frame(_test_dates(cutoff), features)
+    return train, future
+
+def fit_fold_prophet(station, target, cutoff):
+    """
+    Обучает Prophet на ряду пары до среза и возвращает прогноз на горизонт.\n
+    Ряд и признаки берутся из общих данных (shared).
+    """
+    from prophet import Prophet
+
+    train, future = fold_frames(station, target, cutoff)
+    with instrument.stage('backtest_fit', station=station, target=target) as record:
+        record['rows'] = len(train)
+        model = Prophet(**shared['config'])
+        for regressor in train.columns.drop(['ds', 'y']):
+            model.add_regressor(regressor)
+        model.fit(train)
+        prediction = model.predict(future)
+    return {(station, target, cutoff): prediction['yhat'].clip(lower=0).to_numpy()}
+
+def _batch_train(cutoff):
+    data_daily = shared['data_daily']
+    return data_daily[data_daily['Дата'] <= cutoff]
+
+def batch_grid(cutoff):
+    """
+    Возвращает границы сетки дат пакетной модели на срезе: от первого до\n
+    последнего дня обучающих данных всех станций (forecast_batch строит по\n
+    ним тренд и изломы, поэтому от них зависит прогноз каждой пары).
+    """
+    dates = _batch_train(cutoff)['Дата']
+    return str(dates.min().date()), str(dates.max().date())
+
+def fit_fold_batch(cutoff, keys):
+    """
+    Обучает пакетную модель на всех рядах до среза одним проходом\n
+    (batch_forecast.forecast_batch) и возвращает прогнозы пар keys.
+    """
+    stations = sorted({station for station, _ in keys})
+    targets = sorted({target for _, target in keys})
+    train = _batch_train(cutoff)
+    with instrument.stage('backtest_fit_batch') as record:
+        forecasts, _ = batch_forecast.forecast_batch(train, stations, targets, _test_dates(cutoff),
+                                                     params=shared['config'])
+        record['rows'] = len(train)
+    results = {}
+    for target, forecast_list in forecasts.items():
+        for df in forecast_list:
+            station = df['СТАНЦИЯ'].iloc[0]
+            if (station, target) in keys:
+                results[(station, target, cutoff)] = df['yhat'].to_numpy()
+    return results
+
+def run_folds(tasks, engine, workers=1):
+    """
+    Обучает срезы без кэша последовательно или в пуле процессов.\n
+    Для Prophet задача - одна пара на одном срезе, для пакетной модели -\n
+    все пары одного среза. Возвращает словарь вида\n
+    (Станция, Показатель, Срез):Прогноз и словарь ошибок.
+
+    Аргументы:
+        tasks (list): Тройки (Станция, Показатель, Срез).
+        engine (str): Модель - 'prophet' или 'batch'.
+        workers (int): Количество процессов.
+    """
+    if engine == 'batch':
+        by_cutoff = {}
+        for station, target, cutoff in tasks:
+            by_cutoff.setdefault(cutoff, []).append((station, target))
+        jobs = [(fit_fold_batch, (cutoff, frozenset(keys))) for cutoff, keys in by_cutoff.items()]
+    else:
+        jobs = [(fit_fold_prophet, task) for task in tasks]
+
+    if workers > 1 and 'fork' not in mp.get_all_start_methods():
+        print("Параллельное обучение недоступно на этой платформе (нет fork), срезы обучаются последовательно.")
+        workers = 1
+
+    results = {}
+    failed = {}
+    if workers <= 1:
+        for func, args in jobs:
+            try:
+                results.update(func(*args))
+            except Exception as e:
+                failed[args] = e
+        return results, failed
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork')) as pool:
+        futures = {args: pool.submit(func, *args) for func, args in jobs}
+        for args, future in futures.items():
+            try:
+                results.update(future.result())
+            except Exception as e:
+                failed[args] = e
+    return results, failed
+
+def fold_metrics(station, target, cutoff, yhat):
+    """
+    Возвращает ошибки прогноза среза: MAE и MAPE (%, по дням с ненулевым\n
+    фактом) по дням горизонта, для которых есть факт.
+    """
+    ds, y = shared['series'][(station, target)]
+    predicted = pd.Series(yhat, index=_test_dates(cutoff))
+    actual = pd.Series(y, index=ds).reindex(predicted.index).dropna()
+    error = (predicted.reindex(actual.index) - actual).abs()
+    nonzero = actual != 0
+    return {
+        'СТАНЦИЯ': station,
+        'Показатель': target,
+        'Срез': cutoff.date(),
+        'Дней': len(actual),
+        'MAE': error.mean() if len(actual) else None,
+        'MAPE': (error[nonzero] / actual[nonzero].abs()).mean() * 100 if nonzero.any() else None,
+    }
+
+def backtest(data_daily, stations, targets, engine='prophet', params=None, initial=default_initial,
+             horizon=default_horizon, period=default_period, workers=1, use_cache=True, use_features=True):
+    """
+    Кросс-проверка со скользящим срезом: для каждого среза модель\n
+    обучается на данных до него и прогнозирует horizon дней вперёд.\n
+    Прогноз каждого среза кэшируется по ключу (модель, настройки, пара,\n
+    срез, обучающий ряд), поэтому при изменении одной настройки или\n
+    хвоста данных обучаются только затронутые срезы.\n
+    Возвращает ошибки по срезам (DataFrame) и словарь ошибок обучения.
+
+    Аргументы:
+        data_daily (pd.DataFrame): Суточные данные всех станций.
+        stations (list): Имена станций.
+        targets (list): Показатели.
+        engine (str): Модель - 'prophet' или 'batch'.
+        params (dict): Настройки модели поверх настроек по умолчанию.
+        initial (int): Минимальная длина обучения, дней.
+        horizon (int): Горизонт прогноза, дней.
+        period (int): Шаг между срезами, дней.
+        workers (int): Количество процессов.
+        use_cache (bool): Брать прогнозы срезов из кэша.
+        use_features (bool): Подключать к Prophet внешние признаки, как в\n
+            forecast.py (на каждом срезе - рассчитанные по данным до среза).
+    """
+    config = model_config(engine, params)
+
+    # Ряды пар готовятся один раз и наследуются процессами пула
+    shared['data_daily'] = data_daily
+    shared['config'] = config
+    shared['horizon'] = horizon
+    shared['series'] = {}
+    for station in stations:
+        for target in targets:
+            df_prophet = forecast.station_series(data_daily, station, target)
+            shared['series'][(station, target)] = (df_prophet['ds'].to_numpy(dtype='datetime64[ns]'),
+                                                   df_prophet['y'].to_numpy(dtype=np.float64))
+
+    cutoffs = make_cutoffs(data_daily['Дата'], initial, horizon, period)
+    if not cutoffs:
+        raise ValueError(f"Недостаточно данных для срезов: нужно не меньше {initial + horizon} дней.")
+
+    # Признаки среза считаются только по данным до него: на горизонте, как и
+    # в прогнозе, погода неизвестна и продлевается по климатологии
+    shared['features'] = {}
+    if engine == 'prophet' and use_features:
+        horizon_end = cutoffs[-1] + pd.Timedelta(days=horizon)
+        for station in stations:
+            for cutoff in cutoffs:
+                try:
+                    features = feature_store.features_until(station, cutoff, horizon_end)
+                except Exception as e:
+                    print(f"Ошибка расчёта признаков для станции '{station}' на срез {cutoff.date()}: {e}")
+                    continue
+                if features is not None:
+                    shared['features'][(station, cutoff)] = features
+
+    grids = {cutoff: batch_grid(cutoff) for cutoff in cutoffs} if engine == 'batch' else {}
+    keys = {}
+    cached = {}
+    for station, target in shared['series']:
+        for cutoff in cutoffs:
+            train, future = fold_frames(station, target, cutoff)
+            if engine == 'prophet':
+                train_hash = [model_store.series_hash(train), model_store.series_hash(future.assign(y=0.0))]
+            else:
+                train_hash = [model_store.series_hash(train), *grids[cutoff]]
+            key = fold_key(engine, station, target, cutoff, horizon, config, train_hash)
+            keys[(station, target, cutoff)] = key
+            if use_cache and os.path.exists(_cache_path(key)):
+                cached[(station, target, cutoff)] = pd.read_parquet(_cache_path(key))['yhat'].to_numpy()
+
+    tasks = [task for task in keys if task not in cached]
+    print(f"Срезов: {len(cutoffs)}, задач: {len(keys)}, из кэша: {len(cached)}, обучается: {len(tasks)}.")
+    fitted, failed = run_folds(tasks, engine, workers)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for task, yhat in fitted.items():
+        pd.DataFrame({'ds': _test_dates(task[2]), 'yhat': yhat}).to_parquet(_cache_path(keys[task]), index=False)
+
+    predictions = {**cached, **fitted}
+    metrics = pd.DataFrame([fold_metrics(*task, predictions[task]) for task in keys if task in predictions])
+    return metrics, failed
+
+def parse_param(text):
+    """
+    Разбирает настройку вида имя=значение (значение - JSON, иначе строка).
+    """
+    name, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"Ожидается имя=значение: {text}")
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Кросс-проверка прогноза со скользящим срезом (MAE, MAPE по станциям).")
+    parser.add_argument('--engine', choices=forecast.engines, default='prophet',
+                        help="Модель прогноза.")
+    parser.add_argument('--param', type=parse_param, action='append', default=[],
+                        help="Настройка модели имя=значение (можно несколько), например changepoint_prior_scale=0.1.")
+    parser.add_argument('--initial', type=int, default=default_initial,
+                        help="Минимальная длина обучения, дней.")
+    parser.add_argument('--horizon', type=int, default=default_horizon,
+                        help="Горизонт прогноза, дней.")
+    parser.add_argument('--period', type=int, default=default_period,
+                        help="Шаг между срезами, дней.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Количество процессов для обучения срезов (0 - по числу ядер).")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Обучать все срезы заново, не используя кэш прогнозов.")
+    parser.add_argument('--no-features', action='store_true',
+                        help="Обучать Prophet только по дате, без внешних признаков (feature_store.py).")
+    parser.add_argument('--report', action='store_true',
+                        help="Сохранить отчёт о времени и памяти по этапам (reports/).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    params = dict(args.param)
+    unknown = unknown_settings(args.engine, params)
+    if unknown:
+        print(f"Неизвестные настройки модели {args.engine}: {unknown}. Доступны: {setting_names(args.engine)}.")
+        return 1
+    if args.report:
+        instrument.start_run('backtest')
+    try:
+        data_daily = forecast.load_daily_data(forecast.input_dir, forecast.targets)
+        stations = data_daily['СТАНЦИЯ'].unique()
+        metrics, failed = backtest(data_daily, stations, forecast.targets, args.engine, params,
+                                   args.initial, args.horizon, args.period,
+                                   args.workers or os.cpu_count(), use_cache=not args.no_cache,
+                                   use_features=not args.no_features)
+        for task, e in failed.items():
+            print(f"Ошибка обучения среза {task}: {e}")
+
+        os.makedirs(backtest_dir, exist_ok=True)
+        folds_file = os.path.join(backtest_dir, f'кросс_проверка_{args.engine}_срезы.csv')
+        metrics.to_csv(folds_file, index=False, encoding='utf-8-sig')
+
+        summary = metrics.groupby(['СТАНЦИЯ', 'Показатель'])[['MAE', 'MAPE']].mean().reset_index()
+        summary_file = os.path.join(backtest_dir, f'кросс_проверка_{args.engine}.csv')
+        summary.to_csv(summary_file, index=False, encoding='utf-8-sig')
+
+        print(summary.pivot(index='СТАНЦИЯ', columns='Показатель', values='MAPE').round(1).to_string())
+        print(f"Средняя MAPE, %: {summary['MAPE'].mean():.2f}")
+        print(f"Результаты сохранены: {summary_file}, {folds_file}")
+        return 1 if failed else 0
+    finally:
+        instrument.finish_run()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
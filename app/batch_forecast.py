@@ -0,0 +1,155 @@
+import pandas as pd
+import numpy as np
+
+# Годовая сезонность - ряд Фурье того же порядка, что yearly_seasonality=True в Prophet
+yearly_order = 10
+year_days = 365.25
+
+# Изломы тренда: как в Prophet, равномерно по первым 80% истории
+n_changepoints = 25
+changepoint_range = 0.8
+
+# Штрафы (ридж) на изломы тренда и сезонные коэффициенты в нормированных единицах
+changepoint_penalty = 1.0
+seasonality_penalty = 0.01
+
+# Минимум наблюдений в ряду для обучения
+min_observations = 30
+
+# Количество рядов, решаемых за один пакет (ограничивает память 3-D массивов)
+chunk_size = 256
+
+# Настройки модели, которые можно переопределить при вызове forecast_batch (params)
+setting_names = ['yearly_order', 'n_changepoints', 'changepoint_range',
+                 'changepoint_penalty', 'seasonality_penalty', 'min_observations']
+
+
+def model_settings(params=None):
+    """
+    Возвращает настройки модели (setting_names): значения по умолчанию\n
+    этого модуля, переопределённые params.
+    """
+    settings = {name: globals()[name] for name in setting_names}
+    settings.update(params or {})
+    return settings
+
+def design_matrix(ds, t_start, t_scale, changepoints, settings=None):
+    """
+    Возвращает матрицу признаков для дат: константа, линейный тренд,\n
+    изломы тренда, годовые гармоники Фурье и индикаторы дней недели\n
+    (понедельник - базовый). Возвращает матрицу и вектор штрафов.
+
+    Аргументы:
+        ds (pd.DatetimeIndex): Даты.
+        t_start (pd.Timestamp): Начало истории.
+        t_scale (float): Длина истории в днях (время нормируется на [0, 1]).
+        changepoints (np.ndarray): Положения изломов тренда в нормированном времени.
+        settings (dict): Настройки модели (model_settings).
+    """
+    settings = settings or model_settings()
+    t = ((ds - t_start) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64) / t_scale
+    days = ((ds - pd.Timestamp('1970-01-01')) / pd.Timedelta(days=1)).to_numpy(dtype=np.float64)
+
+    columns = [np.ones_like(t), t]
+    penalties = [0.0, 0.0]
+
+    columns += [np.maximum(t - c, 0.0) for c in changepoints]
+    penalties += [settings['changepoint_penalty']] * len(changepoints)
+
+    for k in range(1, settings['yearly_order'] + 1):
+        angle = 2 * np.pi * k * days / year_days
+        columns += [np.sin(angle), np.cos(angle)]
+        penalties += [settings['seasonality_penalty']] * 2
+
+    weekday = ds.dayofweek.to_numpy()
+    columns += [(weekday == day).astype(np.float64) for day in range(1, 7)]
+    penalties += [settings['seasonality_penalty']] * 6
+
+    return np.column_stack(columns), np.asarray(penalties)
+
+def fit_least_squares(X, Y, mask, penalties):
+    """
+    Решает задачи взвешенных наименьших квадратов с риджем для всех рядов\n
+    сразу: по пакетам рядов строятся 3-D массивы X^T W X (ряд x признак x\n
+    признак) и решаются одним вызовом np.linalg.solve.\n
+    Пропуски (mask=False) не участвуют в обучении.
+
+    Аргументы:
+        X (np.ndarray): Признаки, общие для всех рядов (дни x признаки).
+        Y (np.ndarray): Значения (ряды x дни), пропуски - любые.
+        mask (np.ndarray): Наблюдаемые значения (ряды x дни).
+        penalties (np.ndarray): Штрафы на коэффициенты.
+    """
+    weights = mask.astype(np.float64)
+    values = np.where(mask, Y, 0.0)
+    # Небольшая добавка на диагональ - на случай вырожденных рядов
+    ridge = np.diag(penalties + 1e-8)
+
+    beta = np.empty((Y.shape[0], X.shape[1]))
+    for start in range(0, Y.shape[0], chunk_size):
+        w = weights[start:start + chunk_size]
+        XtW = X.T[None, :, :] * w[:, None, :]
+        XtWX = XtW @ X + ridge
+        XtWy = XtW @ values[start:start + chunk_size, :, None]
+        beta[start:start + chunk_size] = np.linalg.solve(XtWX, XtWy)[..., 0]
+    return beta
+
+def forecast_batch(data_daily, stations, targets, future_dates, date_col='Дата', station_col='СТАНЦИЯ',
+                   params=None):
+    """
+    Строит прогнозы для всех пар (станция, показатель) одним пакетным\n
+    проходом: ряды собираются в 3-D массив (показатель x станция x день),\n
+    для всех рядов решается сезонная регрессия (fit_least_squares).\n
+    Возвращает словарь вида Показатель:[прогнозы] с прогнозами в том же\n
+    формате, что forecast_station (СТАНЦИЯ, ds, yhat), и словарь ошибок\n
+    вида (Станция, Показатель):Ошибка.
+
+    Аргументы:
+        data_daily (pd.DataFrame): Суточные данные всех станций.
+        stations (list): Имена станций.
+        targets (list): Прогнозируемые показатели.
+        future_dates (pd.DatetimeIndex): Даты прогноза.
+        params (dict): Настройки модели поверх значений по умолчанию\n
+            (setting_names), только для этого вызова.
+    """
+    settings = model_settings(params)
+    grid = pd.date_range(data_daily[date_col].min(), data_daily[date_col].max(), freq='D')
+    station_idx = pd.Categorical(data_daily[station_col], categories=list(stations)).codes
+    day_idx = ((data_daily[date_col] - grid[0]) // pd.Timedelta(days=1)).to_numpy()
+    known = station_idx >= 0
+
+    cube = np.full((len(targets), len(stations), len(grid)), np.nan)
+    for i, target in enumerate(targets):
+        cube[i, station_idx[known], day_idx[known]] = data_daily[target].to_numpy(dtype=np.float64)[known]
+
+    Y = cube.reshape(-1, len(grid))
+    mask = ~np.isnan(Y)
+
+    # Нормировка каждого ряда на максимум модуля (как y_scale в Prophet)
+    scale = np.abs(np.where(mask, Y, 0.0)).max(axis=1)
+    scale[scale == 0] = 1.0
+
+    t_scale = max((grid[-1] - grid[0]) / pd.Timedelta(days=1), 1.0)
+    changepoints = np.linspace(0, settings['changepoint_range'], settings['n_changepoints'] + 1)[1:]
+    X, penalties = design_matrix(grid, grid[0], t_scale, changepoints, settings)
+    X_future, _ = design_matrix(pd.DatetimeIndex(future_dates), grid[0], t_scale, changepoints, settings)
+
+    beta = fit_least_squares(X, Y / scale[:, None], mask, penalties)
+    yhat = np.clip((beta @ X_future.T) * scale[:, None], 0, None)
+    yhat = yhat.reshape(len(targets), len(stations), len(future_dates))
+    observations = mask.sum(axis=1).reshape(len(targets), len(stations))
+
+    forecasts = {target: [] for target in targets}
+    failed = {}
+    for j, station in enumerate(stations):
+        for i, target in enumerate(targets):
+            if observations[i, j] < settings['min_observations']:
+                failed[(station, target)] = ValueError(f"Недостаточно наблюдений для обучения: {observations[i, j]}"
+                                                       f" (нужно {settings['min_observations']}).")
+                continue
+            forecasts[target].append(pd.DataFrame({
+                'СТАНЦИЯ': station,
+                'ds': future_dates,
+                'yhat': yhat[i, j],
+            }))
+    return forecasts, failed
@@ -0,0 +1,485 @@
+import pandas as pd
+import numpy as np
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime
+import ingest
+from excel_cache import ensure_cached, write_cache
+
+# Директория бенчмарков: синтетические данные, результаты запусков и эталоны
+bench_dir = "benchmarks"
+data_dir = os.path.join(bench_dir, "data")
+results_dir = os.path.join(bench_dir, "results")
+baselines_dir = os.path.join(bench_dir, "baselines")
+
+# Описание сгенерированного набора данных (в корне набора)
+dataset_name = "dataset.json"
+
+# Максимум строк на листе Excel (с учётом строки заголовка)
+excel_max_rows = 1048575
+
+# Скрипты этапов конвейера (запускаются из корня набора данных)
+app_dir = os.path.dirname(os.path.abspath(__file__))
+stage_scripts = {
+    'ingest': os.path.join(app_dir, "ingest.py"),
+    'forecast': os.path.join(app_dir, "forecast.py"),
+}
+
+# Атрибуты листа "Показатели станций" и их масштаб относительно выработки
+indicator_scales = {
+    ingest.gen_energy: 1.0,
+    ingest.own_use_pct: None,
+    ingest.own_use_gen: 0.034,
+    ingest.fuel_cons_el: None,
+    ingest.fuel_cons_rel: 0.31,
+    ingest.heat_rel: 0.9,
+    ingest.own_use_heat1: None,
+    ingest.own_use_heat2: 0.012,
+    ingest.fuel_cons_ht: None,
+    ingest.fuel_cons_ht_rel: 0.14,
+    ingest.rel_from_bus: 0.966,
+    ingest.total_fuel_cons: 0.45,
+}
+
+
+def dataset_dir(stations, years, seed):
+    """
+    Возвращает директорию набора данных для заданного масштаба.
+    """
+    return os.path.join(data_dir, f"s{stations}_y{years}_seed{seed}")
+
+def station_names(stations):
+    return [f"Станция {idx:04d}" for idx in range(1, stations + 1)]
+
+def city_names(stations):
+    return [f"Город {idx:03d}" for idx in range(1, max(1, stations // 5) + 1)]
+
+def seasonal(index, period, phase=0.0):
+    """
+    Возвращает сезонную составляющую (синусоиду) для номеров дней или часов.
+    """
+    return np.sin(2 * np.pi * (np.asarray(index) / period + phase))
+
+def generate_rsv(rng, stations, hours):
+    """
+    Лист "Цены РСВ": Дата и почасовая цена по каждой станции в столбцах.
+    """
+    base = 1000 + 200 * seasonal(hours.dayofyear, 365.25) + 80 * seasonal(hours.hour, 24, 0.3)
+    prices = base[:, None] + rng.normal(0, 25, (len(hours), len(stations))) + rng.normal(0, 30, len(stations))
+    df = pd.DataFrame(np.round(prices, 2), columns=stations)
+    df.insert(0, ingest.date, hours)
+    yield 'Цены РСВ', df
+
+def generate_historical_compos(rng, stations, years, max_rows):
+    """
+    Листы "<год>_ч" исторического состава: по строке на час и станцию,\n
+    состояние блоков 1-10 (1 - в работе, '-' - нет). Если строки не\n
+    помещаются на лист, год делится на листы "<год>_<часть>_ч".
+    """
+    for year in years:
+        hours = pd.date_range(f'{year}-01-01', f'{year}-12-31 23:00', freq='h')
+        chunk = max(1, max_rows // len(hours))
+        parts = [stations[i:i + chunk] for i in range(0, len(stations), chunk)]
+        for part_idx, part in enumerate(parts):
+            index = np.repeat(hours, len(part))
+            df = pd.DataFrame({
+                'МЕСЯЦ': index.month,
+                'Число': index.day,
+                'Час': index.hour,
+                ingest.col1: np.tile(part, len(hours)),
+            })
+            for block in range(1, 11):
+                states = np.full(len(df), '-', dtype=object)
+                states[rng.random(len(df)) < 0.6] = 1
+                df[str(block)] = states
+            sheet_name = f'{year}_ч' if len(parts) == 1 else f'{year}_{part_idx + 1}_ч'
+            yield sheet_name, df
+    # Суточный лист последнего года не используется при загрузке
+    yield f'{years[-1]}_д', pd.DataFrame({'МЕСЯЦ': [1], 'Число': [1]})
+
+def generate_station_indicators(rng, stations, days):
+    """
+    Лист "Показатели станций" в длинном формате: Год, Месяц, День,\n
+    станция, атрибут и значение. Часть значений записана строками\n
+    с запятой в качестве разделителя, как в исходной книге.
+    """
+    n_days, n_stations = len(days), len(stations)
+    capacity = rng.uniform(3000, 30000, n_stations)
+    gen = capacity[None, :] * (1 + 0.25 * seasonal(days.dayofyear, 365.25, 0.25)[:, None])
+    gen = gen * rng.uniform(0.85, 1.15, (n_days, n_stations))
+
+    frames = []
+    for attr, scale in indicator_scales.items():
+        if scale is None:
+            values = rng.uniform(1, 400, (n_days, n_stations))
+        else:
+            values = gen * scale
+        values = np.round(values, 3).astype(object)
+        # Как в исходной книге: числа с запятой хранятся строками
+        as_text = rng.random(values.shape) < 0.7
+        values[as_text] = [f"{v:.3f}".replace('.', ',') for v in values[as_text]]
+        frames.append(pd.DataFrame({
+            'Год': np.repeat(days.year, n_stations),
+            'Месяц': np.repeat(days.month, n_stations),
+            'День': np.repeat(days.day, n_stations),
+            ingest.col2: np.tile(stations, n_days),
+            'Атрибут': attr,
+            'Значение': values.ravel(),
+        }))
+    df = pd.concat(frames, ignore_index=True)
+    df[ingest.col1] = np.nan
+    yield f'{days.year.min() % 100}_{days.year.max() % 100}', df
+
+def generate_tut(rng, stations, years):
+    """
+    Лист "Цена т.у.т.": Год, Месяц и цена по каждой станции в столбцах.
+    """
+    months = pd.date_range(f'{years[0]}-01-01', f'{years[-1]}-12-01', freq='MS')
+    prices = 4300 + rng.normal(0, 150, (len(months), len(stations))) + rng.normal(0, 200, len(stations))
+    df = pd.DataFrame(np.round(prices, 2), columns=stations)
+    df.insert(0, 'Месяц', months.month)
+    df.insert(0, 'Год', months.year)
+    yield 'Лист1', df
+
+def generate_station_list(rng, stations, cities, years):
+    """
+    Листы "<год>" перечня электростанций: город, станция, мощность\n
+    станции и по строке на каждый блок (генерирующее оборудование).
+    """
+    station_city = rng.choice(cities, len(stations))
+    n_blocks = rng.integers(2, 7, len(stations))
+    rows = []
+    for station, city, count in zip(stations, station_city, n_blocks):
+        block_capacity = np.round(rng.uniform(100, 400, count), 1)
+        for block in range(count):
+            rows.append({
+                'Город': city,
+                'Наименование ГТП генерации': station,
+                'установленная мощность станции, МВт': round(block_capacity.sum(), 1),
+                'Ген.оборудование': block + 1,
+                'установленная мощность, МВт': block_capacity[block],
+                'минимум': int(block_capacity[block] * 0.45),
+            })
+    df = pd.DataFrame(rows)
+    for year in reversed(years):
+        yield str(year), df.copy()
+
+def generate_weather(rng, cities, days):
+    """
+    Листы погоды по городам: суточные температуры, ветер и осадки.
+    """
+    for city in cities:
+        avg = 5 + 15 * seasonal(days.dayofyear, 365.25, -0.25) + rng.normal(0, 3, len(days))
+        yield city, pd.DataFrame({
+            'Дата': days,
+            'Максимальная  температура': np.round(avg + rng.uniform(2, 7, len(days)), 1),
+            'Минимальная  температура': np.round(avg - rng.uniform(2, 7, len(days)), 1),
+            'Средняя  температура': np.round(avg, 1),
+            'Скорость  ветра': rng.integers(0, 15, len(days)),
+            'Осадки': np.round(rng.exponential(2, len(days)), 1),
+            'Эффективная  температура': np.round(avg - rng.uniform(0, 8, len(days)), 1),
+        })
+
+def generate_composition_forecast(rng, stations, year):
+    """
+    Лист "Состав на прогноз": суточный состав блоков на первое полугодие.
+    """
+    days = pd.date_range(f'{year}-01-01', f'{year}-06-30', freq='D')
+    df = pd.DataFrame({
+        'МЕСЯЦ': np.repeat(days.month, len(stations)).astype(float),
+        'Число': np.repeat(days.day, len(stations)).astype(float),
+        ingest.col1: np.tile(stations, len(days)),
+    })
+    for block in range(1, 11):
+        states = np.full(len(df), '-', dtype=object)
+        states[rng.random(len(df)) < 0.6] = 1
+        df[str(block)] = states
+    yield str(year), df
+
+def generate_tut_forecast(rng, stations):
+    """
+    Лист "Цена т.у.т. на прогноз": первая строка - номера месяцев,\n
+    далее по строке на станцию (без заголовков, как в исходной книге).
+    """
+    prices = np.round(4300 + rng.normal(0, 200, (len(stations), 6)), 2)
+    df = pd.DataFrame(np.vstack([np.arange(1, 7, dtype=float), prices]),
+                      columns=[f'Unnamed: {idx}' for idx in range(2, 8)])
+    df.insert(0, 'Unnamed: 1', [None] + list(stations))
+    df.insert(0, 'Unnamed: 0', np.nan)
+    yield 'Лист1', df
+
+def write_workbook(path, sheets, mode):
+    """
+    Записывает листы в книгу Excel (mode='xlsx') или сразу в кэш (mode='cache').
+    """
+    if mode == 'cache':
+        write_cache(path, sheets)
+        return
+    with pd.ExcelWriter(path) as writer:
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+
+def generate_dataset(root, stations=9, years=2, seed=0, mode='xlsx'):
+    """
+    Генерирует синтетический набор данных в формате step1__dataset:\n
+    те же книги, листы и столбцы, что и в исходном задании.\n
+    Годы - последние перед прогнозным (2024). Возвращает описание набора.
+
+    Аргументы:
+        root (str): Корень набора (в нём создаются step1__dataset и step1__cache).
+        stations (int): Количество станций.
+        years (int): Количество лет истории.
+        seed (int): Зерно генератора случайных чисел.
+        mode (str): 'xlsx' - настоящие книги Excel, 'cache' - сразу колоночный\n
+            кэш (для масштабов, которые не помещаются в лист Excel).
+    """
+    rng = np.random.default_rng(seed)
+    names = station_names(stations)
+    cities = city_names(stations)
+    year_list = list(range(2024 - years, 2024))
+    hours = pd.date_range(f'{year_list[0]}-01-01', f'{year_list[-1]}-12-31 23:00', freq='h')
+    days = pd.date_range(f'{year_list[0]}-01-01', f'{year_list[-1]}-12-31', freq='D')
+    max_rows = excel_max_rows if mode == 'xlsx' else len(names) * 8784
+
+    if mode == 'xlsx' and len(days) * len(names) * len(indicator_scales) > excel_max_rows:
+        raise ValueError("Показатели станций не помещаются на лист Excel, используйте mode='cache'.")
+
+    workbooks = {
+        ingest.rsv_prices: lambda: generate_rsv(rng, names, hours),
+        ingest.historical_compos: lambda: generate_historical_compos(rng, names, year_list, max_rows),
+        ingest.station_indicators: lambda: generate_station_indicators(rng, names, days),
+        ingest.price_tut: lambda: generate_tut(rng, names, year_list),
+        ingest.power_station_list: lambda: generate_station_list(rng, names, cities, year_list),
+        ingest.weather: lambda: generate_weather(rng, cities, days),
+        ingest.composition_forecast: lambda: generate_composition_forecast(rng, names, 2024),
+        ingest.price_tut_forecast: lambda: generate_tut_forecast(rng, names),
+    }
+
+    cwd = os.getcwd()
+    os.makedirs(os.path.join(root, os.path.dirname(ingest.rsv_prices)), exist_ok=True)
+    os.chdir(root)
+    try:
+        for path, sheets in workbooks.items():
+            started = time.perf_counter()
+            write_workbook(path, sheets(), mode)
+            print(f"Сгенерирована книга '{path}' за {time.perf_counter() - started:.1f} с")
+    finally:
+        os.chdir(cwd)
+
+    description = {
+        'stations': stations,
+        'years': years,
+        'seed': seed,
+        'mode': mode,
+        'hours': len(hours),
+        'created': datetime.now().isoformat(timespec='seconds'),
+    }
+    with open(os.path.join(root, dataset_name), 'w', encoding='utf-8') as f:
+        json.dump(description, f, ensure_ascii=False, indent=2)
+    return description
+
+def run_stage(root, stage, workers, extra_args=()):
+    """
+    Запускает этап конвейера отдельным процессом в корне набора данных\n
+    с отчётом instrument (--report). Возвращает время выполнения и\n
+    сводку отчёта по внутренним этапам.
+    """
+    reports_before = set(glob.glob(os.path.join(root, 'reports', f'{stage}_*')))
+    command = [sys.executable, stage_scripts[stage], '--workers', str(workers), '--report', *extra_args]
+
+    started = time.perf_counter()
+    with open(os.path.join(root, f'{stage}.log'), 'w', encoding='utf-8') as log:
+        code = subprocess.call(command, cwd=root, stdout=log, stderr=subprocess.STDOUT)
+    wall_s = time.perf_counter() - started
+    if code != 0:
+        raise RuntimeError(f"Этап '{stage}' завершился с кодом {code}, подробности в {root}/{stage}.log")
+
+    summary = []
+    new_reports = sorted(set(glob.glob(os.path.join(root, 'reports', f'{stage}_*'))) - reports_before)
+    if new_reports:
+        with open(os.path.join(new_reports[-1], 'report.json'), encoding='utf-8') as f:
+            summary = json.load(f)['summary']
+    return {'wall_s': round(wall_s, 3), 'summary': summary}
+
+def stage_throughput(stage, result):
+    """
+    Возвращает пропускную способность этапа: строк в секунду для загрузки\n
+    и моделей в секунду для прогноза.
+    """
+    summary = {row['stage']: row for row in result['summary']}
+    if stage == 'ingest' and 'merge_station_frames' in summary:
+        return {'rows_per_s': round((summary['merge_station_frames']['rows'] or 0) / result['wall_s'], 1)}
+    if stage == 'forecast' and 'forecast_station' in summary:
+        return {'models_per_s': round(summary['forecast_station']['calls'] / result['wall_s'], 3)}
+    return {}
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=app_dir,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(stations, years, seed, mode, workers, stages, cold=False):
+    """
+    Генерирует (или берёт готовый) набор данных и замеряет этапы\n
+    конвейера целиком. Выходные данные прошлых запусков удаляются,\n
+    чтобы каждый замер начинался с одинакового состояния.
+    """
+    root = dataset_dir(stations, years, seed)
+    description_path = os.path.join(root, dataset_name)
+    if os.path.exists(description_path):
+        with open(description_path, encoding='utf-8') as f:
+            description = json.load(f)
+        if description['mode'] != mode:
+            shutil.rmtree(root)
+    if not os.path.exists(description_path):
+        # Отдельным процессом: пиковая память (ru_maxrss) наследуется дочерними
+        # процессами этапов, и память генератора попала бы в их отчёты
+        command = [sys.executable, os.path.abspath(__file__), '--generate-only', '--stations', str(stations),
+                   '--years', str(years), '--seed', str(seed), '--mode', mode]
+        if subprocess.call(command) != 0:
+            raise RuntimeError("Не удалось сгенерировать набор данных.")
+
+    for name in [ingest.output_dir, 'step3__forecast']:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        # Конвертация книг в кэш - отдельным этапом (при --cold заново).
+        # Состояние кэша записывается в результат: с тёплым кэшем этап почти
+        # ничего не делает, и сравнивать его с холодным замером нельзя
+        if cold and mode == 'xlsx':
+            shutil.rmtree('step1__cache', ignore_errors=True)
+        cache = 'warm' if os.path.isdir('step1__cache') and os.listdir('step1__cache') else 'cold'
+        started = time.perf_counter()
+        for path in ingest.source_workbooks + [ingest.composition_forecast, ingest.price_tut_forecast]:
+            ensure_cached(path)
+        results['excel_cache'] = {'wall_s': round(time.perf_counter() - started, 3), 'summary': []}
+    finally:
+        os.chdir(cwd)
+
+    for stage in stages:
+        print(f"Этап '{stage}' ({stations} станций, {years} лет)...")
+        extra_args = ['--no-plots'] if stage == 'forecast' else []
+        results[stage] = run_stage(os.path.abspath(root), stage, workers, extra_args)
+        results[stage].update(stage_throughput(stage, results[stage]))
+        print(f"Этап '{stage}' выполнен за {results[stage]['wall_s']:.1f} с")
+
+    return {
+        'params': {'stations': stations, 'years': years, 'seed': seed, 'mode': mode,
+                   'workers': workers, 'stages': list(stages), 'cache': cache},
+        'revision': git_revision(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'stages': results,
+    }
+
+def baseline_path(params):
+    return os.path.join(baselines_dir, f"s{params['stations']}_y{params['years']}_w{params['workers']}_{params['mode']}.json")
+
+def _compare_row(name, base, current):
+    base_s = base['wall_s'] if base else None
+    current_s = current['wall_s'] if current else None
+    ratio = round(current_s / base_s, 2) if base_s and current_s is not None else None
+    return {'этап': name, 'эталон, с': base_s, 'сейчас, с': current_s, 'отношение': ratio}
+
+def compare(result, baseline):
+    """
+    Печатает сравнение времени этапов с эталоном (отношение > 1 - медленнее)\n
+    и этапы, которые есть только в замере или только в эталоне.\n
+    Возвращает False без сравнения, если состояние кэша Excel (холодный\n
+    или тёплый) в замере и эталоне разное или не записано.
+    """
+    cache, base_cache = result['params'].get('cache'), baseline['params'].get('cache')
+    if cache is None or cache != base_cache:
+        print(f"Сравнение невозможно: кэш Excel в замере - {cache}, в эталоне - {base_cache}. "
+              f"Повторите замер в том же состоянии (--cold) или пересохраните эталон (--save-baseline).")
+        return False
+
+    rows, missing = [], []
+    for stage in list(dict.fromkeys([*baseline['stages'], *result['stages']])):
+        base, current = baseline['stages'].get(stage), result['stages'].get(stage)
+        rows.append(_compare_row(stage, base, current))
+        if base is None or current is None:
+            missing.append(f"{stage} ({'нет в эталоне' if base is None else 'нет в замере'})")
+            continue
+        base_summary = {row['stage']: row for row in base['summary']}
+        current_summary = {row['stage']: row for row in current['summary']}
+        for name in list(dict.fromkeys([*base_summary, *current_summary])):
+            base_row, row = base_summary.get(name), current_summary.get(name)
+            rows.append(_compare_row(f"  {stage}.{name}", base_row, row))
+            if base_row is None or row is None:
+                missing.append(f"{stage}.{name} ({'нет в эталоне' if base_row is None else 'нет в замере'})")
+    print(f"Сравнение с эталоном (ревизия {baseline.get('revision')}, {baseline.get('created')}, кэш Excel - {cache}):")
+    print(pd.DataFrame(rows).to_string(index=False))
+    if missing:
+        print(f"Этапы без пары для сравнения: {', '.join(missing)}")
+    return True
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера на синтетических данных.")
+    parser.add_argument('--stations', type=int, default=9, help="Количество станций.")
+    parser.add_argument('--years', type=int, default=2, help="Количество лет истории.")
+    parser.add_argument('--seed', type=int, default=0, help="Зерно генератора данных.")
+    parser.add_argument('--mode', choices=['xlsx', 'cache'], default=None,
+                        help="Книги Excel или сразу кэш (по умолчанию - xlsx, если данные помещаются на лист).")
+    parser.add_argument('--workers', type=int, default=1, help="Количество процессов для этапов.")
+    parser.add_argument('--stages', nargs='+', choices=list(stage_scripts), default=list(stage_scripts),
+                        help="Этапы для замера.")
+    parser.add_argument('--cold', action='store_true', help="Заново конвертировать книги Excel в кэш.")
+    parser.add_argument('--generate-only', action='store_true', help="Только сгенерировать набор данных.")
+    parser.add_argument('--save-baseline', action='store_true', help="Сохранить результат как эталон.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    mode = args.mode
+    if mode is None:
+        days = args.years * 366
+        mode = 'xlsx' if days * args.stations * len(indicator_scales) <= excel_max_rows else 'cache'
+
+    if args.generate_only:
+        root = dataset_dir(args.stations, args.years, args.seed)
+        shutil.rmtree(root, ignore_errors=True)
+        generate_dataset(root, args.stations, args.years, args.seed, mode)
+        print(f"Набор данных сохранен: {root}")
+        return
+
+    result = run_benchmark(args.stations, args.years, args.seed, mode, args.workers, args.stages, args.cold)
+
+    os.makedirs(results_dir, exist_ok=True)
+    params = result['params']
+    result_path = os.path.join(results_dir, f"{datetime.now():%Y%m%d_%H%M%S}_s{params['stations']}_y{params['years']}_w{params['workers']}.json")
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Результат сохранен: {result_path}")
+
+    path = baseline_path(params)
+    if args.save_baseline:
+        os.makedirs(baselines_dir, exist_ok=True)
+        shutil.copyfile(result_path, path)
+        print(f"Эталон сохранен: {path}")
+    elif os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            if not compare(result, json.load(f)):
+                return 1
+    else:
+        print(f"Эталон для этого масштаба не найден ({path}), сохраните его с --save-baseline.")
+
+if __name__ == "__main__":
+    raise SystemExit(main())
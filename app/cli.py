@@ -0,0 +1,40 @@
+import argparse
+import importlib
+import sys
+
+# Подкоманды: имя - модуль, дополнительные аргументы и описание. Модуль (и его
+# зависимости: pandas, Prophet, matplotlib) импортируется только при вызове
+# подкоманды, поэтому справка и короткие проверки запускаются быстро
+commands = {
+    'ingest': ('ingest', [], "Трансформация и чистка исходных данных (step2__ingest)."),
+    'forecast': ('forecast', [], "Построение прогноза (step3__forecast)."),
+    'plot': ('forecast', ['--plots-only'], "Графики по уже сохранённым прогнозам, без обучения."),
+    'scenarios': ('scenarios', [], "Сценарный прогноз объёма и стоимости т.у.т. по книгам на прогноз."),
+    'backtest': ('backtest', [], "Кросс-проверка прогноза со скользящим срезом (MAE, MAPE по станциям)."),
+    'rollup': ('rollup', [], "Запросы к сводному кубу объёма, выручки РСВ и стоимости т.у.т. по станциям и городам."),
+    'validate': ('validate', [], "Проверка исходных книг и данных step2__ingest без их загрузки."),
+    'serve': ('forecast_service', [], "Сервис прогноза с обученными моделями в памяти."),
+}
+
+
+def parse_args(argv=None):
+    """
+    Разбирает подкоманду. Остальные аргументы передаются в main() модуля\n
+    подкоманды и разбираются там же (в том числе --help подкоманды).
+    """
+    parser = argparse.ArgumentParser(
+        description="Конвейер прогноза: загрузка данных, прогноз, графики и проверки.",
+        epilog="Аргументы подкоманды: python cli.py <подкоманда> --help")
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='подкоманда')
+    for name, (_, _, help_text) in commands.items():
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    return parser.parse_known_args(argv)
+
+def main(argv=None):
+    args, rest = parse_args(argv)
+    module_name, extra_args, _ = commands[args.command]
+    module = importlib.import_module(module_name)
+    return module.main(extra_args + rest)
+
+if __name__ == "__main__":
+    sys.exit(main())
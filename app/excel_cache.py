@@ -0,0 +1,423 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import numpy as np
+import hashlib
+import json
+import os
+from datetime import date, datetime, time, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+# Директория для колоночного кэша исходных книг Excel
+cache_dir = "step1__cache"
+
+# Имя файла с описанием закэшированной книги
+manifest_name = "manifest.json"
+
+# Версия формата кэша: при изменении все книги будут переконвертированы
+cache_version = 3
+
+# Размер группы строк в Parquet: столько строк читается за раз при потоковом чтении
+row_group_size = 100_000
+
+# Типы значений смешанных столбцов. Значение хранится строкой, а рядом -
+# номер его типа в этом списке (-1 - пропуск), по которому тип
+# восстанавливается точно. Порядок проверки важен: bool - подкласс int,
+# pd.Timestamp - подкласс datetime, datetime - подкласс date
+value_types = [
+    (str, str, str),
+    (bool, str, lambda text: text == 'True'),
+    (int, str, int),
+    (float, repr, float),
+    (pd.Timestamp, pd.Timestamp.isoformat, pd.Timestamp),
+    (datetime, datetime.isoformat, datetime.fromisoformat),
+    (date, date.isoformat, date.fromisoformat),
+    (time, time.isoformat, time.fromisoformat),
+    (pd.Timedelta, pd.Timedelta.isoformat, pd.Timedelta),
+    (timedelta, lambda value: f"{value.days} {value.seconds} {value.microseconds}",
+     lambda text: timedelta(*map(int, text.split()))),
+]
+
+# Суффикс столбца с типами значений смешанного столбца
+type_suffix = " (тип значения)"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Возвращает sha256 содержимого файла, читая его блоками.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _workbook_dir(path):
+    """
+    Возвращает директорию кэша для книги Excel.
+    """
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0])
+
+def _load_manifest(workbook_dir):
+    """
+    Читает манифест книги, если он есть и совпадает по версии формата.
+    """
+    manifest_path = os.path.join(workbook_dir, manifest_name)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != cache_version:
+        return None
+    return manifest
+
+def _save_manifest(workbook_dir, manifest):
+    """
+    Атомарно записывает манифест книги.
+    """
+    manifest_path = os.path.join(workbook_dir, manifest_name)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp_path, manifest_path)
+
+def _mixed_columns(df):
+    """
+    Возвращает столбцы с данными разных типов (например, 1 и '-'),
+    которые нельзя записать в Parquet как есть.
+    """
+    mixed = []
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            mixed.append(col)
+    return mixed
+
+def _type_column(col):
+    return f"{col}{type_suffix}"
+
+def _value_type(value):
+    """
+    Возвращает номер типа значения в value_types (-1 - пропуск).
+    """
+    if not isinstance(value, str) and pd.isna(value):
+        return -1
+    for idx, (value_type, _, _) in enumerate(value_types):
+        if isinstance(value, value_type):
+            return idx
+    raise TypeError(f"Значение типа {type(value).__name__} нельзя записать в кэш: {value!r}")
+
+def _encode_column(values):
+    """
+    Возвращает значения смешанного столбца строками и номера их типов.\n
+    Числа numpy хранятся как числа Python того же вида.
+    """
+    texts = np.empty(len(values), dtype=object)
+    types = np.empty(len(values), dtype=np.int8)
+    for idx, value in enumerate(values):
+        if isinstance(value, (np.number, np.bool_)):
+            value = value.item()
+        types[idx] = _value_type(value)
+        texts[idx] = None if types[idx] < 0 else value_types[types[idx]][1](value)
+    return texts, types
+
+def _decode_column(values, types):
+    """
+    Восстанавливает значения смешанного столбца по строкам и номерам типов.\n
+    Строки читаются словарём, поэтому каждое сочетание (строка, тип)\n
+    разбирается один раз. Пропуски - NaN, как в pd.read_excel.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+    else:
+        codes, categories = pd.factorize(values)
+    types = np.asarray(types, dtype=np.int64)
+    known = (codes >= 0) & (types >= 0)
+    pairs, inverse = np.unique(codes[known].astype(np.int64) * len(value_types) + types[known], return_inverse=True)
+    parsed = np.empty(len(pairs), dtype=object)
+    for idx, pair in enumerate(pairs):
+        parsed[idx] = value_types[pair % len(value_types)][2](categories[pair // len(value_types)])
+    result = np.full(len(codes), np.nan, dtype=object)
+    result[known] = parsed[inverse]
+    return result
+
+def _write_sheet(workbook_dir, idx, sheet_name, df):
+    """
+    Записывает один лист в Parquet и возвращает его описание для манифеста.
+    """
+    columns = list(df.columns)
+    mixed = _mixed_columns(df)
+    df.columns = [str(col) for col in columns]
+    for col in mixed:
+        df[str(col)], df[_type_column(col)] = _encode_column(df[str(col)].to_numpy())
+
+    file_name = f"{idx}.parquet"
+    tmp_path = os.path.join(workbook_dir, file_name + '.tmp')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path, row_group_size=row_group_size)
+    os.replace(tmp_path, os.path.join(workbook_dir, file_name))
+
+    return {
+        'name': sheet_name,
+        'file': file_name,
+        'columns': columns,
+        'mixed': [str(col) for col in mixed],
+    }
+
+def _build_manifest(path, digest, sheets):
+    """
+    Собирает манифест книги с хэшем и временем изменения исходника.
+    """
+    stat = os.stat(path)
+    return {
+        'version': cache_version,
+        'source': path,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'sha256': digest,
+        'sheets': sheets,
+    }
+
+def _convert_sheet(source, workbook_dir, idx, sheet_name):
+    """
+    Читает один лист книги и записывает его в Parquet (задача для пула\n
+    процессов). Возвращает описание листа для манифеста.
+
+    Аргументы:
+        source (str или pd.ExcelFile): Путь к книге или уже открытая книга.
+        workbook_dir (str): Директория кэша книги.
+        idx (int): Номер листа.
+        sheet_name (str): Имя листа.
+    """
+    df = pd.read_excel(source, sheet_name=sheet_name)
+    return _write_sheet(workbook_dir, idx, sheet_name, df)
+
+def convert_workbooks(digests, workers=1):
+    """
+    Конвертирует книги Excel в кэш: каждый лист - отдельный Parquet-файл,\n
+    для каждой книги - манифест с хэшем и временем изменения исходника.\n
+    При workers > 1 листы всех книг разбираются одновременно в пуле\n
+    процессов (openpyxl держит GIL, потоки здесь не помогают), и время\n
+    близко к самому долгому листу, а не к сумме всех.\n
+    Возвращает словарь вида Книга:Манифест.
+
+    Аргументы:
+        digests (dict): Словарь вида Книга:sha256 (None - посчитать).
+        workers (int): Количество процессов.
+    """
+    xls = {}
+    tasks = []
+    for path in digests:
+        workbook_dir = _workbook_dir(path)
+        os.makedirs(workbook_dir, exist_ok=True)
+        xls[path] = pd.ExcelFile(path)
+        for idx, sheet_name in enumerate(xls[path].sheet_names):
+            tasks.append((path, workbook_dir, idx, sheet_name))
+
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        # Последовательно - с уже открытой книгой, без повторного разбора
+        entries = [_convert_sheet(xls[path], *task) for path, *task in tasks]
+    else:
+        # В дочерних процессах книга открывается заново (только нужный лист)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            entries = list(pool.map(_convert_sheet, *zip(*tasks)))
+    for book in xls.values():
+        book.close()
+
+    manifests = {}
+    for path, digest in digests.items():
+        sheets = [entry for task, entry in zip(tasks, entries) if task[0] == path]
+        manifest = _build_manifest(path, digest or file_hash(path), sheets)
+        _save_manifest(_workbook_dir(path), manifest)
+        print(f"Книга '{path}' сконвертирована в кэш: {_workbook_dir(path)}")
+        manifests[path] = manifest
+    return manifests
+
+def convert_workbook(path, digest=None):
+    """
+    Конвертирует все листы книги Excel в отдельные Parquet-файлы
+    и записывает манифест с хэшем и временем изменения исходника.
+
+    Аргументы:
+        path (str): Путь к книге Excel.
+        digest (str): Заранее посчитанный sha256 книги (необязательно).
+    """
+    return convert_workbooks({path: digest})[path]
+
+def write_cache(path, sheets):
+    """
+    Записывает листы напрямую в колоночный кэш, минуя Excel.\n
+    Нужна для синтетических данных, которые не помещаются в лист Excel.\n
+    На месте книги создаётся текстовая заглушка: если кэш будет удалён,\n
+    конвертация завершится ошибкой, а не прочитает пустые данные.
+
+    Аргументы:
+        path (str): Путь к (несуществующей) книге Excel.
+        sheets (iterable): Пары (имя листа, DataFrame), можно генератором.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"Заглушка: данные книги хранятся только в кэше {_workbook_dir(path)}\n")
+
+    workbook_dir = _workbook_dir(path)
+    os.makedirs(workbook_dir, exist_ok=True)
+    entries = [_write_sheet(workbook_dir, idx, sheet_name, df) for idx, (sheet_name, df) in enumerate(sheets)]
+
+    manifest = _build_manifest(path, file_hash(path), entries)
+    _save_manifest(workbook_dir, manifest)
+    return manifest
+
+def _cached_manifest(path):
+    """
+    Возвращает манифест актуального кэша книги и None или None и sha256\n
+    книги, если кэш нужно пересобрать.\n
+    Если размер и время изменения файла не поменялись - кэш считается
+    актуальным без чтения книги. Иначе сверяется sha256 содержимого.
+    """
+    workbook_dir = _workbook_dir(path)
+    manifest = _load_manifest(workbook_dir)
+    stat = os.stat(path)
+
+    if manifest and manifest['size'] == stat.st_size and manifest['mtime'] == stat.st_mtime_ns:
+        return manifest, None
+
+    digest = file_hash(path)
+    if manifest and manifest['sha256'] == digest:
+        # Файл "тронули", но содержимое не изменилось
+        manifest['size'] = stat.st_size
+        manifest['mtime'] = stat.st_mtime_ns
+        _save_manifest(workbook_dir, manifest)
+        return manifest, None
+
+    return None, digest
+
+def ensure_cached(path):
+    """
+    Возвращает манифест закэшированной книги, при необходимости
+    переконвертировав её.
+
+    Аргументы:
+        path (str): Путь к книге Excel.
+    """
+    manifest, digest = _cached_manifest(path)
+    return manifest if manifest is not None else convert_workbook(path, digest)
+
+def ensure_cached_all(paths, workers=1):
+    """
+    Возвращает манифесты нескольких книг (словарь вида Книга:Манифест),\n
+    переконвертировав изменившиеся книги одним пулом процессов\n
+    (convert_workbooks).
+
+    Аргументы:
+        paths (list): Пути к книгам Excel.
+        workers (int): Количество процессов для конвертации.
+    """
+    manifests = {}
+    stale = {}
+    for path in paths:
+        manifest, digest = _cached_manifest(path)
+        if manifest is None:
+            stale[path] = digest
+        else:
+            manifests[path] = manifest
+    if stale:
+        manifests.update(convert_workbooks(stale, workers))
+    return {path: manifests[path] for path in paths}
+
+def cache_status(path):
+    """
+    Возвращает состояние кэша книги без чтения и конвертации книги:\n
+    'fresh' - размер и время изменения совпадают с манифестом,\n
+    'stale' - книга изменилась (кэш пересоберётся при следующем чтении),\n
+    'missing' - кэша нет.
+
+    Аргументы:
+        path (str): Путь к книге Excel.
+    """
+    manifest = _load_manifest(_workbook_dir(path))
+    if manifest is None:
+        return 'missing'
+    stat = os.stat(path)
+    return 'fresh' if manifest['size'] == stat.st_size and manifest['mtime'] == stat.st_mtime_ns else 'stale'
+
+def sheet_names(path):
+    """
+    Возвращает список листов книги Excel (аналог pd.ExcelFile.sheet_names).
+    """
+    return [sheet['name'] for sheet in ensure_cached(path)['sheets']]
+
+def _find_sheet(path, sheet_name):
+    """
+    Возвращает описание листа из манифеста по имени или номеру.
+    """
+    sheets = ensure_cached(path)['sheets']
+    if isinstance(sheet_name, int):
+        return sheets[sheet_name]
+    sheet = next((s for s in sheets if s['name'] == sheet_name), None)
+    if sheet is None:
+        raise ValueError(f"Лист '{sheet_name}' не найден в книге '{path}'.")
+    return sheet
+
+def _restore(df, sheet):
+    """
+    Восстанавливает значения смешанных столбцов в исходных типах (по\n
+    столбцам типов) и оригинальные имена столбцов (в Parquet они\n
+    хранятся строками). Столбцы типов в результат не попадают.
+    """
+    names = dict(zip([str(col) for col in sheet['columns']], sheet['columns']))
+    for col in sheet['mixed']:
+        if col in df.columns:
+            df[col] = _decode_column(df[col], df[_type_column(col)].to_numpy())
+    df = df.drop(columns=[_type_column(col) for col in sheet['mixed'] if _type_column(col) in df.columns])
+    df.columns = [names.get(col, col) for col in df.columns]
+    return df
+
+def _read_columns(sheet, columns):
+    """
+    Возвращает столбцы Parquet для чтения: запрошенные и столбцы типов\n
+    запрошенных смешанных столбцов (None - все).
+    """
+    if columns is None:
+        return None
+    columns = [str(col) for col in columns]
+    return columns + [_type_column(col) for col in columns if col in sheet['mixed']]
+
+def read_excel(path, sheet_name=0, columns=None):
+    """
+    Возвращает лист книги Excel из колоночного кэша (аналог pd.read_excel).
+
+    Аргументы:
+        path (str): Путь к книге Excel.
+        sheet_name (str | int): Имя или номер листа.
+        columns (list): Список столбцов для чтения (по умолчанию - все).
+    """
+    sheet = _find_sheet(path, sheet_name)
+    columns = _read_columns(sheet, columns)
+
+    df = pq.read_table(os.path.join(_workbook_dir(path), sheet['file']), columns=columns,
+                       read_dictionary=sheet['mixed']).to_pandas()
+    return _restore(df, sheet)
+
+def iter_excel(path, sheet_name=0, columns=None, chunk_rows=row_group_size):
+    """
+    Возвращает лист книги Excel из колоночного кэша блоками строк\n
+    (генератор DataFrame). В памяти одновременно находится только\n
+    одна группа строк Parquet, а не весь лист.
+
+    Аргументы:
+        path (str): Путь к книге Excel.
+        sheet_name (str | int): Имя или номер листа.
+        columns (list): Список столбцов для чтения (по умолчанию - все).
+        chunk_rows (int): Количество строк в блоке.
+    """
+    sheet = _find_sheet(path, sheet_name)
+    columns = _read_columns(sheet, columns)
+
+    parquet_file = pq.ParquetFile(os.path.join(_workbook_dir(path), sheet['file']), read_dictionary=sheet['mixed'])
+    try:
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield _restore(batch.to_pandas(), sheet)
+    finally:
+        parquet_file.close()
@@ -0,0 +1,215 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import hashlib
+import json
+import os
+from excel_cache import file_hash
+
+# Суточные данные станций (ingest.py --resolutions daily) и хранилище признаков
+daily_dir = os.path.join("step2__ingest", "daily")
+features_dir = os.path.join("step2__ingest", "features")
+
+# Версия расчёта признаков: при изменении все признаки будут пересчитаны
+feature_version = 1
+
+# Ключ хэша признаков в метаданных файла Parquet
+key_field = b'feature_key'
+
+# Размер группы строк: одна группа - около года, чтобы по статистике дат
+# (pyarrow filters) можно было читать только нужные годы
+row_group_size = 366
+
+# Исходные показатели станции и способ их продления на период прогноза:
+# 'climate' - среднее за тот же день года по истории, 'last' - последнее значение
+base_columns = {
+    'Эффективная температура': 'climate',
+    'Средняя температура': 'climate',
+    'Цена РСВ': 'climate',
+    'Блоков в работе': 'climate',
+    'Цена т.у.т.': 'last',
+    'Установленная мощность станции, МВт': 'last',
+}
+
+# Лаги и скользящие средние (в днях) по исходным показателям
+lags = {
+    'Эффективная температура': [1, 7],
+}
+windows = {
+    'Эффективная температура': [7, 30],
+    'Цена РСВ': [7],
+}
+
+# Признаки, подключаемые к Prophet через add_regressor. Цена т.у.т. меняется
+# ступенькой раз в год и на отложенном 2023 годе ухудшает прогноз, поэтому
+# остаётся только в хранилище
+regressors = [
+    'Эффективная температура',
+    'Эффективная температура (среднее 7 дн.)',
+]
+
+# Признаки, уже прочитанные в этом процессе, вида Станция:(Ключ, DataFrame)
+_memory = {}
+
+
+def _source_path(station_name):
+    return os.path.join(daily_dir, f"{station_name}.parquet")
+
+def _features_path(station_name):
+    return os.path.join(features_dir, f"{station_name}.parquet")
+
+def feature_names():
+    """
+    Возвращает имена всех признаков в порядке столбцов хранилища.
+    """
+    names = list(base_columns)
+    for column, periods in lags.items():
+        names += [f"{column} (лаг {n} дн.)" for n in periods]
+    for column, periods in windows.items():
+        names += [f"{column} (среднее {n} дн.)" for n in periods]
+    return names
+
+def feature_key(source_path, end):
+    """
+    Возвращает sha256 исходного файла, настроек признаков и конца периода.
+    """
+    config = [feature_version, base_columns, lags, windows, str(pd.Timestamp(end).date())]
+    digest = hashlib.sha256(file_hash(source_path).encode('utf-8'))
+    digest.update(json.dumps(config, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return digest.hexdigest()
+
+def _base_frame(source_path):
+    """
+    Читает из суточного файла станции только исходные показатели признаков.\n
+    'Блоков в работе' - среднее за сутки число работающих блоков (сумма\n
+    часов работы блоков / 24).
+    """
+    names = pq.read_schema(source_path).names
+    block_columns = [col for col in names if col.endswith(' Блок')]
+    columns = ['Дата'] + [col for col in base_columns if col in names] + block_columns
+    df = pd.read_parquet(source_path, columns=columns).sort_values('Дата')
+    df['Блоков в работе'] = df[block_columns].sum(axis=1) / 24 if block_columns else 0.0
+    df = df.set_index('Дата')
+    return df.reindex(columns=list(base_columns)).astype('float64')
+
+def compute_features(base, end):
+    """
+    Рассчитывает признаки станции по суточным данным на период от первого\n
+    дня данных до end. После последнего дня данных показатели продлеваются\n
+    по base_columns, затем по всему периоду сразу считаются лаги и\n
+    скользящие средние (векторно, по всем столбцам).
+
+    Аргументы:
+        base (pd.DataFrame): Исходные показатели станции с индексом 'Дата'.
+        end (str): Последний день периода (конец прогноза).
+    """
+    dates = pd.date_range(base.index.min(), max(pd.Timestamp(end), base.index.max()), freq='D')
+    df = base[~base.index.duplicated()].reindex(dates)
+    history = df.index <= base.index.max()
+
+    # Среднее по дню года (29 февраля без истории берёт значение 28-го)
+    day_of_year = df.index.strftime('%m-%d')
+    climate = df[history].groupby(day_of_year[history]).mean()
+    climate_columns = [col for col, method in base_columns.items() if method == 'climate']
+    filled = climate.reindex(day_of_year)[climate_columns].ffill().set_axis(df.index)
+    df[climate_columns] = df[climate_columns].fillna(filled[climate_columns])
+    df = df.ffill().bfill()
+
+    lagged = {f"{column} (лаг {n} дн.)": df[column].shift(n) for column, periods in lags.items() for n in periods}
+    rolling = {f"{column} (среднее {n} дн.)": df[column].rolling(n, min_periods=1).mean()
+               for column, periods in windows.items() for n in periods}
+    df = pd.concat([df, pd.DataFrame(lagged), pd.DataFrame(rolling)], axis=1).bfill()
+    df.index.name = 'Дата'
+    return df.astype('float32').reset_index()
+
+def load_features(station_name, end, use_cache=True):
+    """
+    Возвращает признаки станции (столбец 'Дата' и feature_names()) на\n
+    период до end или None, если нет суточных данных станции.\n
+    Признаки берутся из памяти процесса или хранилища, если исходный файл\n
+    и настройки не изменились, иначе рассчитываются и сохраняются.
+
+    Аргументы:
+        station_name (str): Имя станции.
+        end (str): Последний день периода (конец прогноза).
+        use_cache (bool): Брать признаки из хранилища.
+    """
+    source_path = _source_path(station_name)
+    if not os.path.exists(source_path):
+        return None
+    key = feature_key(source_path, end)
+
+    if use_cache and station_name in _memory and _memory[station_name][0] == key:
+        return _memory[station_name][1]
+
+    path = _features_path(station_name)
+    if use_cache and os.path.exists(path):
+        metadata = pq.read_schema(path).metadata or {}
+        if metadata.get(key_field) == key.encode('utf-8'):
+            features = pd.read_parquet(path)
+            _memory[station_name] = (key, features)
+            return features
+
+    features = compute_features(_base_frame(source_path), end)
+    table = pa.Table.from_pandas(features, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), key_field: key.encode('utf-8')})
+    os.makedirs(features_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    pq.write_table(table, tmp_path, row_group_size=row_group_size)
+    os.replace(tmp_path, path)
+    _memory[station_name] = (key, features)
+    return features
+
+def features_until(station_name, cutoff, end):
+    """
+    Возвращает признаки станции, рассчитанные только по данным до cutoff\n
+    включительно (после него - как на период прогноза), или None, если нет\n
+    суточных данных станции. Нужны для проверки моделей на истории:\n
+    отложенный период получает те же признаки, что и прогноз, без\n
+    фактической погоды. В хранилище не сохраняются.
+
+    Аргументы:
+        station_name (str): Имя станции.
+        cutoff (str): Последний день известных данных.
+        end (str): Последний день периода.
+    """
+    source_path = _source_path(station_name)
+    if not os.path.exists(source_path):
+        return None
+    base = _base_frame(source_path)
+    return compute_features(base[base.index <= pd.Timestamp(cutoff)], end)
+
+def features_with_rows(station_name, rows, end):
+    """
+    Возвращает признаки станции, рассчитанные по суточным данным вместе\n
+    с переданными строками исходных показателей: их значения заменяют\n
+    прежние за те же сутки и продлевают историю (после неё показатели\n
+    продлеваются по base_columns). В хранилище не сохраняются.
+
+    Аргументы:
+        station_name (str): Имя станции.
+        rows (pd.DataFrame): Исходные показатели (часть base_columns) с индексом 'Дата'.
+        end (str): Последний день периода (конец прогноза).
+    """
+    source_path = _source_path(station_name)
+    rows = rows.reindex(columns=list(base_columns)).astype('float64')
+    base = rows.combine_first(_base_frame(source_path)) if os.path.exists(source_path) else rows
+    return compute_features(base.sort_index(), end)
+
+def load_all(stations, end, use_cache=True):
+    """
+    Возвращает признаки всех станций словарём вида Станция:DataFrame.\n
+    Станции без суточных данных пропускаются с предупреждением.
+    """
+    features = {}
+    for station_name in stations:
+        try:
+            station_features = load_features(station_name, end, use_cache)
+        except Exception as e:
+            print(f"Ошибка расчёта признаков для станции '{station_name}': {e}")
+            continue
+        if station_features is None:
+            print(f"Предупреждение: нет суточных данных станции '{station_name}', прогноз без внешних признаков.")
+            continue
+        features[station_name] = station_features
+    return features
@@ -1,19 +1,67 @@
 import pandas as pd
-from prophet import Prophet
+import json
+import pyarrow.parquet as pq
 import glob
 import os
 import re
-import matplotlib.pyplot as plt
+import signal
+import argparse
+import time
+import importlib
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from concurrent.futures import ProcessPoolExecutor
+import model_store
+import instrument
+import batch_forecast
+import feature_store
+
+# Prophet (с cmdstanpy) и render (с matplotlib) импортируются только там, где
+# они нужны: --help, пакетная модель и проверки данных запускаются без них
 
 output_dir = "step3__forecast"
+input_dir = "step2__ingest"
+
+# Суточные данные станций (ingest.py --resolutions daily) - поддиректория input_dir
+daily_subdir = "daily"
+
+# Настройки модели Prophet
+prophet_params = dict(
+    yearly_seasonality=True,
+    weekly_seasonality=True,
+    daily_seasonality=False,
+    seasonality_mode='additive'
+)
+
+# Период прогноза
+forecast_start = '2024-01-01'
+forecast_end = '2024-06-30'
+
+# Начало отложенной выборки для сравнения моделей (обучение - до этой даты)
+holdout_start = '2023-01-01'
+
+# Модели прогноза: Prophet по каждой паре (станция, показатель) или пакетная
+# сезонная регрессия по всем рядам сразу (batch_forecast.py)
+engines = ['prophet', 'batch']
+
+# Прогнозируемые показатели (имена после замены '/' на '_')
+targets = [
+    'Общий расход условного топлива т.у.т.',
+    'Расход топлива на отпуск э_э т.у.т.',  # Используем 'э_э' после замены
+    'Расход топлива на отпуск тепла т.у.т.'
+]
+
+# Общие для всех задач данные (data_daily). Заполняются в main() до запуска
+# пула процессов и наследуются дочерними процессами при fork
+shared = {}
 
 # Функция для очистки имени файла
 def sanitize_filename(filename):
     # Заменяем все недопустимые символы на знак подчеркивания
     return re.sub(r'[\\/:"*?<>|]+', '_', filename)
 
-# Функция для прогнозирования и сохранения графиков
-def forecast_station(data_daily, station_name, target_column, plots_dir):
+# Функция для подготовки ряда станции в формате Prophet (ds, y и внешние признаки)
+def station_series(data_daily, station_name, target_column, features=None, regressors=None):
     # Фильтруем данные по станции
     df_station = data_daily[data_daily['СТАНЦИЯ'] == station_name]
     
@@ -25,22 +73,78 @@ def forecast_station(data_daily, station_name, target_column, plots_dir):
         print(f"Предупреждение: Есть пропуски в данных для станции {station_name}, показателя {target_column}. Заполняем пропуски методом прямого заполнения.")
         df_prophet['y'].fillna(method='ffill', inplace=True)
         df_prophet['y'].fillna(method='bfill', inplace=True)
-    
-    # Инициализируем модель Prophet с настройками
-    model = Prophet(
-        yearly_seasonality=True,
-        weekly_seasonality=True,
-        daily_seasonality=False,
-        seasonality_mode='additive'
-    )
-    model.fit(df_prophet)
+
+    # Подключаем внешние признаки станции (feature_store.py) по дате
+    if features is not None:
+        regressor_frame = _regressor_frame(features, regressors)
+        df_prophet = df_prophet.merge(regressor_frame, on='ds', how='left')
+        columns = regressor_frame.columns[1:]
+        df_prophet[columns] = df_prophet[columns].ffill().bfill()
+    return df_prophet
+
+def _regressor_frame(features, regressors=None):
+    # Признаки, которых у станции нет (например, нет погоды по городу), не подключаются
+    columns = [col for col in (feature_store.regressors if regressors is None else regressors)
+               if features[col].notna().all()]
+    return features[['Дата'] + columns].rename(columns={'Дата': 'ds'})
+
+def future_frame(future_dates, features=None, regressors=None):
+    """
+    Возвращает даты прогноза в формате Prophet (ds) с внешними признаками\n
+    станции, если они переданы (те же столбцы, что в station_series).
+    """
+    future = pd.DataFrame({'ds': future_dates})
+    if features is not None:
+        future = future.merge(_regressor_frame(features, regressors), on='ds', how='left').ffill().bfill()
+    return future
+
+# Функция для получения обученной модели: из хранилища (model_store) или обучением.
+# Возвращает модель и хэш ряда
+def fit_station_model(df_prophet, station_name, target_column, use_cache=True):
+    # Внешние признаки - все столбцы ряда, кроме ds и y
+    regressors = [col for col in df_prophet.columns if col not in ('ds', 'y')]
+    config = {**prophet_params, 'regressors': regressors} if regressors else prophet_params
+
+    # Ищем модель, уже обученную на этом же ряду
+    digest = model_store.series_hash(df_prophet, config)
+    model = model_store.load_model(station_name, target_column, digest) if use_cache else None
+
+    if model is not None:
+        print(f"Модель для станции '{station_name}', показателя '{target_column}' взята из кэша.")
+    else:
+        from prophet import Prophet
+
+        # Инициализируем модель Prophet с настройками
+        model = Prophet(**prophet_params)
+        for regressor in regressors:
+            model.add_regressor(regressor)
+
+        # Если изменился только хвост ряда - продолжаем с параметров прошлой модели
+        init = model_store.warm_start_params(station_name, target_column, df_prophet, config) if use_cache else None
+        with instrument.stage('fit', station=station_name, target=target_column) as record:
+            record['rows'] = len(df_prophet)
+            if init is not None:
+                print(f"Тёплый старт для станции '{station_name}', показателя '{target_column}'.")
+                model.fit(df_prophet, init=init)
+            else:
+                model.fit(df_prophet)
+        model_store.save_model(station_name, target_column, digest, model)
+    return model, digest
+
+# Функция для прогнозирования и сохранения кадра прогноза
+@instrument.timed()
+def forecast_station(data_daily, station_name, target_column, frames_dir, use_cache=True, features=None):
+    df_prophet = station_series(data_daily, station_name, target_column, features)
+    model, digest = fit_station_model(df_prophet, station_name, target_column, use_cache)
     
     # Создаем будущие даты для прогнозирования с 01.01.2024 по 30.06.2024
-    future_dates = pd.date_range(start='2024-01-01', end='2024-06-30')
-    future = pd.DataFrame({'ds': future_dates})
+    future_dates = pd.date_range(start=forecast_start, end=forecast_end)
+    future = future_frame(future_dates, features)
     
     # Прогнозируем
-    forecast = model.predict(future)
+    with instrument.stage('predict', station=station_name, target=target_column) as record:
+        forecast = model.predict(future)
+        record['rows'] = len(forecast)
     
     # Добавляем название станции
     forecast['СТАНЦИЯ'] = station_name
@@ -51,97 +155,457 @@ def forecast_station(data_daily, station_name, target_column, plots_dir):
     # Замена отрицательных значений на 0
     forecast_needed['yhat'] = forecast_needed['yhat'].clip(lower=0)
     
-    # Построение и сохранение графика
-    plt.figure(figsize=(10, 6))
-    model.plot(forecast)
-    plt.title(f'Прогноз для станции {station_name} - {target_column}')
-    
-    # Создаем имя файла для графика
-    plot_filename = f'прогноз_{sanitize_filename(station_name)}_{sanitize_filename(target_column)}.png'
-    plot_path = os.path.join(plots_dir, plot_filename)
-    
-    # Сохраняем график
-    plt.savefig(plot_path)
-    plt.close()
-    
-    print(f"График сохранен: {plot_path}")
+    # Сохраняем полный кадр прогноза и описание для отрисовки графика (render.py)
+    name = f'прогноз_{sanitize_filename(station_name)}_{sanitize_filename(target_column)}'
+    forecast.to_parquet(os.path.join(frames_dir, f'{name}.parquet'), index=False)
+    with open(os.path.join(frames_dir, f'{name}.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'station': station_name,
+            'target': target_column,
+            'digest': digest,
+            'frame': f'{name}.parquet',
+            'plot': f'{name}.png',
+        }, f, ensure_ascii=False)
     
     return forecast_needed
 
-# Чтение файлов Excel
-path = 'step2__ingest/'
-excel_files = glob.glob(os.path.join(path, '*.xlsx'))
+def _is_needed_column(column, columns):
+    return columns is None or column == 'Дата' or column.replace('/', '_') in columns
 
-data = pd.DataFrame()
+def load_station_daily(file, columns=None):
+    """
+    Читает файл одной станции и сразу агрегирует его до суточных сумм.\n
+    В памяти одновременно находятся только данные этой станции. Для\n
+    суточного файла агрегация ничего не меняет (одна строка на сутки).
 
-for file in excel_files:
+    Аргументы:
+        file (str): Файл станции (.parquet или .xlsx).
+        columns (list): Нужные показатели (по умолчанию - все столбцы).
+    """
     # Извлекаем название станции из имени файла
     station_name = os.path.splitext(os.path.basename(file))[0]
-    
-    # Читаем данные из файла Excel
-    df = pd.read_excel(file)
-    
-    # Добавляем столбец с названием станции
-    df['СТАНЦИЯ'] = station_name
-    
+
+    # Читаем только нужные столбцы
+    if file.endswith('.parquet'):
+        names = pq.read_schema(file).names
+        df = pd.read_parquet(file, columns=[col for col in names if _is_needed_column(col, columns)])
+    else:
+        df = pd.read_excel(file, usecols=lambda col: _is_needed_column(col, columns))
+
     # Преобразуем 'Дата' в datetime
     df['Дата'] = pd.to_datetime(df['Дата'], errors='coerce')  # Добавляем обработку ошибок
-    
+
     # Удаляем строки с некорректными датами
     df = df.dropna(subset=['Дата'])
-    
-    # Объединяем данные
-    data = pd.concat([data, df], ignore_index=True)
-
-# Агрегируем данные до суточных суммарных значений
-data_daily = data.groupby(['СТАНЦИЯ', pd.Grouper(key='Дата', freq='D')]).sum().reset_index()
-
-# Опционально: Замена '/' на '_' в именах столбцов для удобства
-data_daily.columns = data_daily.columns.str.replace('/', '_')
-
-# Проверка имен столбцов
-print("Имена столбцов в data_daily:")
-print(data_daily.columns.tolist())
-
-# Словарь для хранения прогнозов по каждому показателю
-forecasts = {
-    'Общий расход условного топлива т.у.т.': [],
-    'Расход топлива на отпуск э_э т.у.т.': [],  # Используем 'э_э' после замены
-    'Расход топлива на отпуск тепла т.у.т.': []
-}
-
-# Убедитесь, что все ключи присутствуют в data_daily
-for key in forecasts.keys():
-    if key not in data_daily.columns:
-        print(f"Ошибка: Столбец '{key}' отсутствует в data_daily.")
-        print("Проверьте имена столбцов и обновите словарь 'forecasts' соответственно.")
-        exit(1)
-
-stations = data_daily['СТАНЦИЯ'].unique()
-
-# Создаем директорию для сохранения графиков
-plots_dir = os.path.join(output_dir, 'plots')
-os.makedirs(plots_dir, exist_ok=True)
-
-for station in stations:
-    for target in forecasts.keys():
-        print(f"Прогнозирование для станции '{station}', показателя '{target}'...")
-        forecast_df = forecast_station(data_daily, station, target, plots_dir)
-        forecasts[target].append(forecast_df)
-
-# Сохранение результатов в CSV файлы
-for target, forecast_list in forecasts.items():
-    # Объединяем прогнозы по всем станциям для данного показателя
-    result_df = pd.concat(forecast_list, ignore_index=True)
-    
-    # Переименовываем столбцы согласно требуемой структуре
-    result_df = result_df.rename(columns={'ds': 'дата', 'yhat': 'Значение'})
-    result_df = result_df[['СТАНЦИЯ', 'дата', 'Значение']]
-    
-    # Очищаем имя файла
-    filename = os.path.join(output_dir, f'прогноз_{sanitize_filename(target)}.csv')
-    result_df.to_csv(filename, index=False, sep=',', encoding='utf-8-sig')
-    
-    print(f"CSV файл сохранен: {filename}")
 
-print("Прогнозирование и построение графиков завершено успешно. CSV файлы и графики сохранены.")
+    # Агрегируем данные до суточных суммарных значений (только числовые столбцы)
+    df_daily = df.groupby(df['Дата'].dt.floor('D')).sum(numeric_only=True).reset_index()
+
+    # Добавляем столбец с названием станции
+    df_daily.insert(0, 'СТАНЦИЯ', station_name)
+    return df_daily
+
+def _station_files(directory):
+    """
+    Возвращает файлы станций в директории вида Станция:Файл (Parquet,\n
+    а если их нет - выгрузка в Excel).
+    """
+    files = glob.glob(os.path.join(directory, '*.parquet')) or glob.glob(os.path.join(directory, '*.xlsx'))
+    return {os.path.splitext(os.path.basename(file))[0]: file for file in files}
+
+@instrument.timed()
+def load_daily_data(path, columns=None):
+    """
+    Читает файлы станций из step2__ingest и агрегирует их до суточных сумм.\n
+    Если ingest сохранил суточные данные станции (поддиректория daily) и\n
+    файл не старше почасового, читается он - в 24 раза меньше строк и без\n
+    суммирования часов. Иначе (например, после ingest --resolutions hourly)\n
+    читается почасовой файл, он агрегируется сразу после чтения.\n
+    Суточные данные объединяются одним concat в конце. Читаются файлы\n
+    Parquet, а если их нет - выгрузка в Excel.
+
+    Аргументы:
+        path (str): Директория с файлами станций.
+        columns (list): Нужные показатели (по умолчанию - все столбцы).
+    """
+    hourly_files = _station_files(path)
+    daily_files = _station_files(os.path.join(path, daily_subdir))
+    files = []
+    for station in sorted(set(hourly_files) | set(daily_files)):
+        daily_file, hourly_file = daily_files.get(station), hourly_files.get(station)
+        if daily_file and (not hourly_file or os.path.getmtime(daily_file) >= os.path.getmtime(hourly_file)):
+            files.append(daily_file)
+        else:
+            files.append(hourly_file)
+
+    daily_frames = [load_station_daily(file, columns) for file in files]
+
+    # Столбцы, которых нет у части станций, при суммировании дают 0
+    data_daily = pd.concat(daily_frames, ignore_index=True).fillna(0)
+
+    # Опционально: Замена '/' на '_' в именах столбцов для удобства
+    data_daily.columns = data_daily.columns.str.replace('/', '_')
+    return data_daily
+
+def forecast_task(station_name, target_column, frames_dir, use_cache=True):
+    """
+    Строит прогноз для одной пары (станция, показатель) по общим данным\n
+    (shared).
+    """
+    return forecast_station(shared['data_daily'], station_name, target_column, frames_dir, use_cache,
+                            shared.get('features', {}).get(station_name))
+
+def _task_process(sender, station_name, target_column, frames_dir, use_cache):
+    # Своя группа процессов: при превышении времени вместе с процессом
+    # завершается и запущенный им cmdstan
+    os.setpgrp()
+    try:
+        result = (True, forecast_task(station_name, target_column, frames_dir, use_cache))
+    except Exception as e:
+        result = (False, e)
+    try:
+        sender.send(result)
+    except Exception as e:
+        # Результат, который не удалось передать между процессами, заменяется текстом ошибки
+        sender.send((False, RuntimeError(str(e) if result[0] else str(result[1]))))
+    finally:
+        sender.close()
+
+def _kill_task(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        # Процесс ещё не успел создать свою группу
+        process.kill()
+    process.join()
+
+def forecast_all_timeout(tasks, frames_dir, workers, timeout, use_cache=True):
+    """
+    Обучает пары в отдельных процессах (не больше workers одновременно).\n
+    Процесс, обучение в котором идёт дольше timeout секунд, завершается\n
+    вместе со своей группой (в том числе cmdstan), пара получает ошибку\n
+    TimeoutError, а следующая пара обучается в новом процессе. При\n
+    прерывании (Ctrl-C) или ошибке завершаются группы всех процессов.\n
+    Возвращает словарь вида (Станция, Показатель):Прогноз и словарь ошибок.
+
+    Аргументы:
+        tasks (list): Пары (Станция, Показатель).
+        frames_dir (str): Директория для кадров прогнозов.
+        workers (int): Количество одновременно работающих процессов.
+        timeout (int): Ограничение времени на одно обучение, секунд.
+        use_cache (bool): Использовать сохранённые модели (model_store).
+    """
+    # Prophet импортируется до запуска процессов: иначе каждый новый процесс
+    # тратил бы на импорт часть отведённого на обучение времени
+    importlib.import_module('prophet')
+
+    context = mp.get_context('fork')
+    pending = list(tasks)
+    running = {}  # Канал результата:(Пара, Процесс, Срок)
+    results = {}
+    failed = {}
+
+    try:
+        while pending or running:
+            while pending and len(running) < max(workers, 1):
+                station, target = pending.pop(0)
+                print(f"Прогнозирование для станции '{station}', показателя '{target}'...")
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=_task_process,
+                                          args=(sender, station, target, frames_dir, use_cache), daemon=True)
+                process.start()
+                running[receiver] = ((station, target), process, time.monotonic() + timeout)
+                sender.close()
+
+            nearest = min(deadline for _, _, deadline in running.values())
+            for receiver in wait(list(running), timeout=max(nearest - time.monotonic(), 0)):
+                key, process, _ = running.pop(receiver)
+                try:
+                    ok, value = receiver.recv()
+                except EOFError:
+                    process.join()
+                    ok, value = False, RuntimeError(f"Процесс обучения завершился с кодом {process.exitcode}.")
+                receiver.close()
+                process.join()
+                (results if ok else failed)[key] = value
+
+            now = time.monotonic()
+            for receiver, (key, process, deadline) in list(running.items()):
+                if now >= deadline:
+                    _kill_task(process)
+                    receiver.close()
+                    del running[receiver]
+                    failed[key] = TimeoutError(f"Превышено время обучения модели ({timeout} с).")
+    finally:
+        # Процессы в своих группах не получают Ctrl-C терминала и не завершаются
+        # вместе с основным процессом - их группы завершаются явно
+        for receiver, (_, process, _) in running.items():
+            _kill_task(process)
+            receiver.close()
+    return results, failed
+
+def forecast_all(stations, targets, frames_dir, workers=1, timeout=None, use_cache=True):
+    """
+    Строит прогнозы для всех пар (станция, показатель) последовательно\n
+    или в пуле процессов. Каждое обучение Prophet независимо, поэтому\n
+    пары раздаются процессам по одной. Результаты собираются в порядке\n
+    станций и показателей независимо от порядка завершения задач.\n
+    Возвращает словарь вида Показатель:[прогнозы] и словарь ошибок\n
+    вида (Станция, Показатель):Ошибка.
+
+    Аргументы:
+        stations (list): Имена станций.
+        targets (list): Прогнозируемые показатели.
+        frames_dir (str): Директория для кадров прогнозов.
+        workers (int): Количество процессов.
+        timeout (int): Ограничение времени на одно обучение, секунд\n
+            (каждая пара обучается в своём процессе, см. forecast_all_timeout).
+        use_cache (bool): Использовать сохранённые модели (model_store).
+    """
+    tasks = [(station, target) for station in stations for target in targets]
+    results = {}
+    failed = {}
+
+    if (workers > 1 or timeout) and 'fork' not in mp.get_all_start_methods():
+        print("Параллельное обучение и ограничение времени недоступны на этой платформе (нет fork), "
+              "модели обучаются последовательно.")
+        workers, timeout = 1, None
+
+    if timeout:
+        results, failed = forecast_all_timeout(tasks, frames_dir, workers, timeout, use_cache)
+    elif workers <= 1:
+        for station, target in tasks:
+            print(f"Прогнозирование для станции '{station}', показателя '{target}'...")
+            try:
+                results[(station, target)] = forecast_task(station, target, frames_dir, use_cache)
+            except Exception as e:
+                failed[(station, target)] = e
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork')) as pool:
+            futures = {}
+            for station, target in tasks:
+                print(f"Прогнозирование для станции '{station}', показателя '{target}'...")
+                futures[(station, target)] = pool.submit(forecast_task, station, target, frames_dir, use_cache)
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    failed[key] = e
+
+    forecasts = {target: [results[(station, target)] for station in stations if (station, target) in results]
+                 for target in targets}
+    return forecasts, failed
+
+def forecast_all_batch(stations, targets):
+    """
+    Строит прогнозы для всех пар (станция, показатель) пакетной моделью\n
+    (batch_forecast.py) по общим данным (shared). Возвращает то же, что\n
+    forecast_all: словарь вида Показатель:[прогнозы] и словарь ошибок.
+    """
+    future_dates = pd.date_range(start=forecast_start, end=forecast_end)
+    with instrument.stage('forecast_batch') as record:
+        forecasts, failed = batch_forecast.forecast_batch(shared['data_daily'], stations, targets, future_dates)
+        record['rows'] = sum(len(df) for forecast_list in forecasts.values() for df in forecast_list)
+    return forecasts, failed
+
+def prophet_holdout(train, test_dates, station_name, target_column, features=None):
+    """
+    Обучает Prophet на отложенной выборке без хранилища моделей\n
+    и возвращает прогноз на даты test_dates. С признаками (features)\n
+    модель та же, что в forecast_station.
+    """
+    df_prophet = station_series(train, station_name, target_column, features)
+    from prophet import Prophet
+    model = Prophet(**prophet_params)
+    for regressor in df_prophet.columns.drop(['ds', 'y']):
+        model.add_regressor(regressor)
+    model.fit(df_prophet)
+    forecast = model.predict(future_frame(test_dates, features))
+    return forecast['yhat'].clip(lower=0).to_numpy()
+
+def compare_engines(data_daily, stations, targets, split=holdout_start, use_features=True):
+    """
+    Сравнивает точность пакетной модели и Prophet на отложенной выборке:\n
+    обе модели обучаются на данных до split и прогнозируют остаток истории.\n
+    Возвращает DataFrame с ошибками (MAE, RMSE, WAPE) по каждой паре\n
+    (станция, показатель) и модели, а также время обучения.
+
+    Аргументы:
+        data_daily (pd.DataFrame): Суточные данные всех станций.
+        stations (list): Имена станций.
+        targets (list): Прогнозируемые показатели.
+        split (str): Начало отложенной выборки.
+        use_features (bool): Подключать к Prophet внешние признаки, как в\n
+            прогнозе (рассчитанные только по данным до split).
+    """
+    train = data_daily[data_daily['Дата'] < split]
+    test = data_daily[data_daily['Дата'] >= split]
+    test_dates = pd.date_range(split, test['Дата'].max())
+
+    predictions = {}
+    timings = {}
+
+    with instrument.stage('compare_batch') as record:
+        batch, _ = batch_forecast.forecast_batch(train, stations, targets, test_dates)
+    timings['batch'] = record['wall_s']
+    for target, forecast_list in batch.items():
+        for df in forecast_list:
+            predictions[('batch', df['СТАНЦИЯ'].iloc[0], target)] = df['yhat'].to_numpy()
+
+    with instrument.stage('compare_prophet') as record:
+        for station in stations:
+            features = None
+            if use_features:
+                features = feature_store.features_until(station, test_dates[0] - pd.Timedelta(days=1), test_dates[-1])
+            for target in targets:
+                try:
+                    predictions[('prophet', station, target)] = prophet_holdout(train, test_dates, station, target,
+                                                                                features)
+                except Exception as e:
+                    print(f"Ошибка Prophet на отложенной выборке для станции '{station}', показателя '{target}': {e}")
+    timings['prophet'] = record['wall_s']
+
+    rows = []
+    for (engine, station, target), yhat in predictions.items():
+        actual = test[test['СТАНЦИЯ'] == station].set_index('Дата')[target]
+        predicted = pd.Series(yhat, index=test_dates).reindex(actual.index)
+        error = predicted - actual
+        rows.append({
+            'СТАНЦИЯ': station,
+            'Показатель': target,
+            'Модель': engine,
+            'MAE': error.abs().mean(),
+            'RMSE': (error ** 2).mean() ** 0.5,
+            'WAPE': error.abs().sum() / actual.abs().sum() if actual.abs().sum() else None,
+        })
+    return pd.DataFrame(rows), timings
+
+def render_plots(frames_dir, plots_dir, workers=1):
+    """
+    Отдельный этап отрисовки графиков по сохранённым прогнозам.
+    """
+    import render
+    failed = render.render_all(frames_dir, plots_dir, workers)
+    for meta_path, e in failed.items():
+        print(f"Ошибка построения графика '{meta_path}': {e}")
+    print(f"Графики сохранены в {plots_dir}.")
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Построение прогноза расхода топлива по станциям.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Количество процессов для обучения моделей (0 - по числу ядер).")
+    parser.add_argument('--timeout', type=int, default=None,
+                        help="Ограничение времени на обучение одной модели, секунд (каждая модель - в своём процессе).")
+    parser.add_argument('--no-model-cache', action='store_true',
+                        help="Обучать все модели заново, не используя сохранённые.")
+    parser.add_argument('--engine', choices=engines, default='prophet',
+                        help="Модель прогноза: Prophet по каждому ряду или пакетная регрессия по всем рядам.")
+    parser.add_argument('--no-features', action='store_true',
+                        help="Обучать Prophet только по дате, без внешних признаков (feature_store.py), в том числе при --compare.")
+    parser.add_argument('--compare', action='store_true',
+                        help=f"Сравнить точность пакетной модели и Prophet на данных с {holdout_start} и выйти.")
+    plots = parser.add_mutually_exclusive_group()
+    plots.add_argument('--no-plots', action='store_true',
+                       help="Только прогноз и CSV, без графиков.")
+    plots.add_argument('--plots-only', action='store_true',
+                       help="Только графики по уже сохранённым прогнозам, без обучения.")
+    parser.add_argument('--report', action='store_true',
+                        help="Сохранить отчёт о времени и памяти по этапам, станциям и моделям (reports/).")
+    parser.add_argument('--profile', action='store_true',
+                        help="Дополнительно сохранить профиль cProfile основного процесса (включает --report).")
+    return parser.parse_args(argv)
+
+def run(args):
+    workers = args.workers or os.cpu_count()
+
+    frames_dir = os.path.join(output_dir, 'frames')
+    plots_dir = os.path.join(output_dir, 'plots')
+    os.makedirs(frames_dir, exist_ok=True)
+
+    if args.plots_only:
+        render_plots(frames_dir, plots_dir, workers)
+        return
+
+    data_daily = load_daily_data(input_dir, targets)
+    shared['data_daily'] = data_daily
+
+    # Проверка имен столбцов
+    print("Имена столбцов в data_daily:")
+    print(data_daily.columns.tolist())
+
+    # Убедитесь, что все ключи присутствуют в data_daily
+    for key in targets:
+        if key not in data_daily.columns:
+            print(f"Ошибка: Столбец '{key}' отсутствует в data_daily.")
+            print("Проверьте имена столбцов и обновите список 'targets' соответственно.")
+            exit(1)
+
+    stations = data_daily['СТАНЦИЯ'].unique()
+
+    if args.compare:
+        metrics, timings = compare_engines(data_daily, stations, targets, use_features=not args.no_features)
+        filename = os.path.join(output_dir, f'сравнение_моделей_{holdout_start[:4]}.csv')
+        metrics.to_csv(filename, index=False, sep=',', encoding='utf-8-sig')
+        print(f"Сравнение моделей сохранено: {filename}")
+        print(metrics.groupby(['Показатель', 'Модель'])[['MAE', 'WAPE']].mean().to_string())
+        print("Время обучения, с: " + ", ".join(f"{engine} - {wall_s:.2f}" for engine, wall_s in timings.items()))
+        return
+
+    if args.engine == 'batch':
+        forecasts, failed = forecast_all_batch(stations, targets)
+    else:
+        # Признаки считаются один раз на станцию до запуска пула процессов
+        if not args.no_features:
+            with instrument.stage('load_features') as record:
+                shared['features'] = feature_store.load_all(stations, forecast_end)
+                record['rows'] = sum(len(df) for df in shared['features'].values())
+        forecasts, failed = forecast_all(stations, targets, frames_dir, workers, args.timeout,
+                                         use_cache=not args.no_model_cache)
+    for (station, target), e in failed.items():
+        print(f"Ошибка прогнозирования для станции '{station}', показателя '{target}': {e}")
+
+    # Сохранение результатов в CSV файлы
+    for target, forecast_list in forecasts.items():
+        if not forecast_list:
+            print(f"Нет прогнозов для показателя '{target}', CSV файл не сохранен.")
+            continue
+
+        # Объединяем прогнозы по всем станциям для данного показателя
+        result_df = pd.concat(forecast_list, ignore_index=True)
+        
+        # Переименовываем столбцы согласно требуемой структуре
+        result_df = result_df.rename(columns={'ds': 'дата', 'yhat': 'Значение'})
+        result_df = result_df[['СТАНЦИЯ', 'дата', 'Значение']]
+        
+        # Очищаем имя файла
+        filename = os.path.join(output_dir, f'прогноз_{sanitize_filename(target)}.csv')
+        with instrument.stage('write_csv', target=target) as record:
+            result_df.to_csv(filename, index=False, sep=',', encoding='utf-8-sig')
+            record['rows'] = len(result_df)
+        
+        print(f"CSV файл сохранен: {filename}")
+
+    if failed:
+        print(f"Прогнозирование завершено с ошибками ({len(failed)} моделей). CSV файлы сохранены для остальных.")
+    else:
+        print("Прогнозирование завершено успешно. CSV файлы сохранены.")
+
+    if args.engine == 'batch':
+        print("Графики строятся только для моделей Prophet, для пакетной модели они пропущены.")
+    elif not args.no_plots:
+        render_plots(frames_dir, plots_dir, workers)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.report or args.profile:
+        instrument.start_run('forecast', profile=args.profile)
+    try:
+        run(args)
+    finally:
+        instrument.finish_run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+import pandas as pd
+import argparse
+import copy
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs
+import forecast
+import feature_store
+
+# Адрес сервиса по умолчанию (только локальные подключения)
+default_host = "127.0.0.1"
+default_port = 8765
+
+# Сколько обученных моделей держать в памяти (вытесняются давно не использованные)
+default_max_models = 64
+
+# Количество потоков для переобучения моделей после загрузки новых данных
+default_refit_workers = 1
+
+# Обученные модели вида (Станция, Показатель):Модель в порядке использования (LRU)
+registry = OrderedDict()
+registry_lock = threading.Lock()
+
+# Блокировки подгонки по паре (станция, показатель): одна пара не обучается дважды одновременно
+fit_locks = {}
+
+# Состояние сервиса. Заполняется в start_service()
+state = {
+    'data_daily': None,        # Суточные данные всех станций (заменяется целиком при загрузке данных)
+    'data_lock': threading.Lock(),
+    'executor': None,          # Пул потоков переобучения
+    'pending': set(),          # Пары, ожидающие переобучения
+    'refitting': set(),        # Пары, которые переобучаются сейчас
+    'max_models': default_max_models,
+    'intervals': False,        # Считать интервалы прогноза (yhat_lower, yhat_upper)
+    'use_features': True,      # Обучать модели с внешними признаками (feature_store.py), как forecast.py
+    'features_lock': threading.Lock(),
+    'feature_rows': {},        # Исходные показатели признаков из /push вида Станция:DataFrame
+    'features': {},            # Признаки станций с учётом feature_rows (сбрасываются при /push)
+}
+
+
+def _fit_lock(key):
+    with registry_lock:
+        return fit_locks.setdefault(key, threading.RLock())
+
+def _check_key(station_name, target_column):
+    """
+    Проверяет, что станция и показатель есть в данных сервиса.
+    """
+    data_daily = state['data_daily']
+    if target_column not in data_daily.columns or target_column in ('СТАНЦИЯ', 'Дата'):
+        raise KeyError(f"Показатель '{target_column}' не найден.")
+    if not (data_daily['СТАНЦИЯ'] == station_name).any():
+        raise KeyError(f"Станция '{station_name}' не найдена.")
+
+def put_model(key, model):
+    """
+    Помещает модель в реестр и вытесняет давно не использованные модели\n
+    сверх лимита (max_models).
+    """
+    if not state['intervals']:
+        # Без выборки интервалов predict занимает миллисекунды. Меняем копию:
+        # модель из fit_station_model может быть общей (model_store, forecast.py)
+        model = copy.copy(model)
+        model.uncertainty_samples = 0
+    with registry_lock:
+        registry[key] = model
+        registry.move_to_end(key)
+        while len(registry) > state['max_models']:
+            registry.popitem(last=False)
+
+def station_features(station_name):
+    """
+    Возвращает внешние признаки станции на период до конца прогноза\n
+    forecast.py или None (признаки выключены или нет суточных данных).\n
+    Признаки те же, что в forecast.py, поэтому модели в хранилище общие.\n
+    Если через /push переданы исходные показатели станции, признаки\n
+    пересчитываются с ними (feature_store.features_with_rows).
+    """
+    if not state['use_features']:
+        return None
+    with state['features_lock']:
+        rows = state['feature_rows'].get(station_name)
+        if rows is None:
+            return feature_store.load_features(station_name, forecast.forecast_end)
+        if station_name not in state['features']:
+            state['features'][station_name] = feature_store.features_with_rows(station_name, rows, forecast.forecast_end)
+        return state['features'][station_name]
+
+def fit_model(station_name, target_column):
+    """
+    Обучает модель пары по текущим данным сервиса (или берёт её из\n
+    хранилища model_store, если ряд не изменился) и помещает в реестр.
+    """
+    key = (station_name, target_column)
+    with _fit_lock(key):
+        df_prophet = forecast.station_series(state['data_daily'], station_name, target_column,
+                                             station_features(station_name))
+        model, _ = forecast.fit_station_model(df_prophet, station_name, target_column)
+        put_model(key, model)
+        return model
+
+def get_model(station_name, target_column):
+    """
+    Возвращает обученную модель пары из реестра. Если её там нет,\n
+    модель загружается из хранилища или обучается (первый запрос).
+    """
+    key = (station_name, target_column)
+    with registry_lock:
+        model = registry.get(key)
+        if model is not None:
+            registry.move_to_end(key)
+            return model
+
+    _check_key(station_name, target_column)
+    with _fit_lock(key):
+        # Пока ждали блокировку, модель могла обучиться в другом потоке
+        with registry_lock:
+            model = registry.get(key)
+        return model if model is not None else fit_model(station_name, target_column)
+
+def predict(station_name, target_column, start, end):
+    """
+    Возвращает прогноз пары на даты с start по end (включительно)\n
+    в виде списка словарей (ds, yhat и, если включены, интервалы).\n
+    Отрицательные значения заменяются на 0, как в forecast.py.
+
+    Аргументы:
+        station_name (str): Имя станции.
+        target_column (str): Показатель.
+        start (str): Первая дата прогноза.
+        end (str): Последняя дата прогноза.\n
+            После конца периода признаков берутся их последние значения.
+    """
+    future_dates = pd.date_range(start=start, end=end)
+    if future_dates.empty:
+        raise ValueError("Пустой период прогноза: дата начала позже даты окончания.")
+
+    model = get_model(station_name, target_column)
+    regressors = list(model.extra_regressors)
+    features = station_features(station_name) if regressors else None
+    prediction = model.predict(forecast.future_frame(future_dates, features, regressors))
+
+    columns = [col for col in ['ds', 'yhat', 'yhat_lower', 'yhat_upper'] if col in prediction.columns]
+    result = prediction[columns].copy()
+    result[columns[1:]] = result[columns[1:]].clip(lower=0)
+    result['ds'] = result['ds'].dt.strftime('%Y-%m-%d')
+    return result.to_dict(orient='records')
+
+def schedule_refit(key):
+    """
+    Ставит пару в очередь на переобучение в фоне. Пока переобучение\n
+    не закончилось, запросы прогноза обслуживает прежняя модель.
+    """
+    with registry_lock:
+        if key in state['pending']:
+            return
+        state['pending'].add(key)
+    state['executor'].submit(_refit, key)
+
+def _refit(key):
+    # Снимаем отметку до чтения данных: новые данные, пришедшие во время
+    # обучения, поставят пару в очередь ещё раз
+    with registry_lock:
+        state['pending'].discard(key)
+        state['refitting'].add(key)
+    try:
+        fit_model(*key)
+    except Exception as e:
+        print(f"Ошибка при переобучении модели для станции '{key[0]}', показателя '{key[1]}': {e}")
+    finally:
+        with registry_lock:
+            state['refitting'].discard(key)
+
+def push_rows(station_name, rows):
+    """
+    Добавляет или заменяет суточные данные станции и ставит в очередь\n
+    переобучение моделей по переданным показателям. Исходные показатели\n
+    признаков (feature_store.base_columns, например 'Эффективная\n
+    температура') меняют признаки станции, и переобучаются все её модели\n
+    в памяти. Данные хранятся только в памяти сервиса. Возвращает\n
+    количество строк, переобучаемые показатели и переданные признаки.
+
+    Аргументы:
+        station_name (str): Имя станции.
+        rows (list): Строки вида {'Дата': '2024-01-01', Показатель: Значение, ...}.
+    """
+    new_rows = pd.DataFrame(rows)
+    if new_rows.empty or 'Дата' not in new_rows.columns:
+        raise ValueError("Нужны строки со столбцом 'Дата'.")
+    new_rows.columns = new_rows.columns.str.replace('/', '_')
+    new_rows['Дата'] = pd.to_datetime(new_rows['Дата']).dt.floor('D')
+    new_rows.insert(0, 'СТАНЦИЯ', station_name)
+    feature_columns = [col for col in new_rows.columns if col in feature_store.base_columns and state['use_features']]
+
+    with state['data_lock']:
+        data_daily = state['data_daily']
+        unknown = [col for col in new_rows.columns if col not in data_daily.columns and col not in feature_columns]
+        if unknown:
+            raise KeyError(f"Неизвестные показатели: {unknown}.")
+
+        # Переданные значения заменяют прежние за те же сутки, остальные показатели сохраняются.
+        # Данные заменяются целиком - потоки прогноза продолжают читать прежний DataFrame
+        new_rows = new_rows.drop_duplicates(['СТАНЦИЯ', 'Дата'], keep='last').set_index(['СТАНЦИЯ', 'Дата'])
+        target_rows = new_rows.drop(columns=feature_columns).dropna(how='all')
+        if not target_rows.empty:
+            merged = target_rows.combine_first(data_daily.set_index(['СТАНЦИЯ', 'Дата']))
+            state['data_daily'] = merged.reset_index()[list(data_daily.columns)]
+
+    updated = [col for col in new_rows.columns if col not in feature_columns and new_rows[col].notna().any()]
+    features = [col for col in feature_columns if new_rows[col].notna().any()]
+    if features:
+        feature_rows = new_rows[features].droplevel('СТАНЦИЯ').dropna(how='all').astype('float64')
+        with state['features_lock']:
+            previous = state['feature_rows'].get(station_name)
+            state['feature_rows'][station_name] = (feature_rows if previous is None
+                                                   else feature_rows.combine_first(previous))
+            state['features'].pop(station_name, None)
+        # Модели станции в памяти обучены на прежних признаках
+        with registry_lock:
+            updated += [key[1] for key in registry if key[0] == station_name and key[1] not in updated]
+
+    for target_column in updated:
+        schedule_refit((station_name, target_column))
+    return {'rows': len(new_rows), 'refits': updated, 'features': features}
+
+def status():
+    """
+    Возвращает состояние сервиса: модели в памяти, очередь переобучения, данные.
+    """
+    data_daily = state['data_daily']
+    with registry_lock:
+        models = [list(key) for key in registry]
+        pending = [list(key) for key in state['pending']]
+        refitting = [list(key) for key in state['refitting']]
+    return {
+        'models': models,
+        'max_models': state['max_models'],
+        'pending_refits': pending,
+        'refitting': refitting,
+        'stations': int(data_daily['СТАНЦИЯ'].nunique()),
+        'rows': len(data_daily),
+        'last_date': str(data_daily['Дата'].max().date()),
+    }
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP-обработчик запросов к сервису:\n
+    GET /predict?station=...&target=...&start=...&end=... - прогноз;\n
+    POST /push {"station": ..., "rows": [...]} - новые суточные данные;\n
+    GET /status - состояние сервиса.
+    """
+
+    def _send(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, action):
+        started = time.perf_counter()
+        try:
+            payload = action()
+            payload['ms'] = round((time.perf_counter() - started) * 1000, 2)
+            self._send(200, payload)
+        except KeyError as e:
+            self._send(404, {'error': str(e.args[0]) if e.args else str(e)})
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+        except Exception as e:
+            print(f"Ошибка при обработке запроса {self.path}: {e}")
+            self._send(500, {'error': str(e)})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == '/predict':
+            def action():
+                missing = [name for name in ['station', 'target'] if name not in query]
+                if missing:
+                    raise ValueError(f"Не заданы параметры: {missing}.")
+                target_column = query['target'].replace('/', '_')
+                return {
+                    'station': query['station'],
+                    'target': target_column,
+                    'forecast': predict(query['station'], target_column,
+                                        query.get('start', forecast.forecast_start),
+                                        query.get('end', forecast.forecast_end)),
+                }
+            self._handle(action)
+        elif url.path == '/status':
+            self._handle(status)
+        else:
+            self._send(404, {'error': f"Неизвестный путь: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/push':
+            self._send(404, {'error': f"Неизвестный путь: {url.path}"})
+            return
+
+        def action():
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            if 'station' not in body or 'rows' not in body:
+                raise ValueError("Нужны поля 'station' и 'rows'.")
+            return push_rows(body['station'], body['rows'])
+        self._handle(action)
+
+    def address_string(self):
+        # У Unix-сокета нет адреса клиента
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        # Запросы не журналируются: сервис отвечает за миллисекунды, журнал был бы дороже ответа
+        pass
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        # Поля, которые BaseHTTPRequestHandler ожидает от HTTP-сервера
+        self.server_name = 'unix'
+        self.server_port = 0
+
+def start_service(data_daily, max_models=default_max_models, refit_workers=default_refit_workers,
+                  intervals=False, warm=False, use_features=True):
+    """
+    Подготавливает состояние сервиса: данные, пул переобучения, реестр.
+
+    Аргументы:
+        data_daily (pd.DataFrame): Суточные данные всех станций (forecast.load_daily_data).
+        max_models (int): Сколько моделей держать в памяти.
+        refit_workers (int): Количество потоков переобучения.
+        intervals (bool): Считать интервалы прогноза (медленнее).
+        warm (bool): Загрузить модели всех пар в фоне при запуске.
+        use_features (bool): Обучать модели с внешними признаками.
+    """
+    state['data_daily'] = data_daily
+    state['max_models'] = max_models
+    state['intervals'] = intervals
+    state['use_features'] = use_features
+    state['executor'] = ThreadPoolExecutor(max_workers=max(refit_workers, 1))
+    registry.clear()
+    state['pending'].clear()
+    state['refitting'].clear()
+    state['feature_rows'].clear()
+    state['features'].clear()
+
+    if warm:
+        stations = data_daily['СТАНЦИЯ'].unique()
+        keys = [(station, target) for station in stations for target in forecast.targets
+                if target in data_daily.columns]
+        for key in keys[:max_models]:
+            schedule_refit(key)
+
+def make_server(host=default_host, port=default_port, socket_path=None):
+    """
+    Создаёт HTTP-сервер на TCP-порту или на Unix-сокете (socket_path).
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        return ThreadingUnixHTTPServer(socket_path, ForecastRequestHandler)
+    return ThreadingHTTPServer((host, port), ForecastRequestHandler)
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Сервис прогноза: обученные модели в памяти, ответы за миллисекунды.")
+    parser.add_argument('--host', default=default_host, help="Адрес для подключений.")
+    parser.add_argument('--port', type=int, default=default_port, help="TCP-порт.")
+    parser.add_argument('--socket', default=None,
+                        help="Путь к Unix-сокету (вместо TCP-порта).")
+    parser.add_argument('--max-models', type=int, default=default_max_models,
+                        help="Сколько обученных моделей держать в памяти.")
+    parser.add_argument('--refit-workers', type=int, default=default_refit_workers,
+                        help="Количество потоков переобучения после загрузки новых данных.")
+    parser.add_argument('--intervals', action='store_true',
+                        help="Возвращать интервалы прогноза (yhat_lower, yhat_upper), ответы медленнее.")
+    parser.add_argument('--warm', action='store_true',
+                        help="Загрузить модели всех пар в фоне сразу после запуска.")
+    parser.add_argument('--no-features', action='store_true',
+                        help="Обучать модели только по дате, без внешних признаков (feature_store.py).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_daily = forecast.load_daily_data(forecast.input_dir, forecast.targets)
+    start_service(data_daily, args.max_models, args.refit_workers, args.intervals, args.warm,
+                  not args.no_features)
+
+    server = make_server(args.host, args.port, args.socket)
+    address = args.socket or f"http://{args.host}:{args.port}"
+    print(f"Сервис прогноза запущен: {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Сервис прогноза остановлен.")
+    finally:
+        server.server_close()
+        state['executor'].shutdown(wait=False, cancel_futures=True)
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
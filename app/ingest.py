@@ -1,11 +1,18 @@
 import pandas as pd
 import traceback
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import os
 import numpy as np
 from pandas.tseries.offsets import DateOffset
 import re
-import calendar
-from datetime import datetime, timedelta
+from functools import lru_cache
+from excel_cache import read_excel, iter_excel, sheet_names, ensure_cached_all
+import instrument
+import rollup
+from schema import apply_schema, parse_numeric, frame_memory_mb
+from ingest_state import frame_hash, load_state, save_state, workbooks_key
 
 # Имена файлов с входными данными
 rsv_prices         = "step1__dataset/Цены РСВ 2022-2023 - зашифрованные.xlsx"
@@ -15,10 +22,16 @@ weather            = "step1__dataset/Погода (Нью-Йорк - Бост
 station_indicators = "step1__dataset/Показатели станций 22-23_зашифрованные.xlsx"
 price_tut          = "step1__dataset/Цена т.у.т. - зашифрованная.xlsx"
 
+# Книги, от которых зависят данные step2__ingest
+source_workbooks = [rsv_prices, historical_compos, power_station_list, weather, station_indicators, price_tut]
+
 # На прогноз 
 composition_forecast = "step1__dataset/Состав на прогноз - зашифрованный.xlsx"
 price_tut_forecast   = "step1__dataset/Цена т.у.т. на прогноз - 2024.xlsx"
 
+# Год цен в книге "Цена т.у.т. на прогноз" (в книге указаны только номера месяцев)
+price_tut_forecast_year = 2024
+
 # Имена указателей на станцию в файлах (п) Столбец1, Column2 итд
 col1 = 'Столбец1' # Исторический состав
 col2 = 'Column2' # Показатели станций
@@ -26,8 +39,18 @@ col2 = 'Column2' # Показатели станций
 # Имя директории для выходных данных
 output_dir = "step2__ingest"
 
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
+# Разрешения выходных данных: шаг времени и директория. Почасовые данные -
+# основной формат step2__ingest, суточные нужны прогнозу (step3__forecast)
+# и собираются без разворачивания суточных источников до часов
+resolution_steps = {
+    'hourly': 'h',
+    'daily': 'D',
+}
+resolution_dirs = {
+    'hourly': output_dir,
+    'daily': os.path.join(output_dir, "daily"),
+}
+default_resolutions = ['hourly', 'daily']
 
 # Имена столбцов
 date             = "Дата"
@@ -72,9 +95,39 @@ total_fuel_cons  = "Общий расход условного топлива т
 tut              = "Цена т.у.т."
 multi_tut        = "Стоимость т.у.т."
 
-# Словарь вида Город:Станция
-city_gtp_dict = {}
+block_columns    = [block1, block2, block3, block4, block5, block6, block7, block8, block9, block10]
+
+# Столбцы блоков в файле "Исторический состав"
+hc_blocks        = [str(idx) for idx in range(1, 11)]
+
+# Атрибуты файла "Показатели станций"
+indicator_columns = [gen_energy, own_use_pct, own_use_gen, fuel_cons_el,
+                     fuel_cons_rel, heat_rel, own_use_heat1, own_use_heat2,
+                     fuel_cons_ht, fuel_cons_ht_rel, rel_from_bus, total_fuel_cons]
+
+# Схема данных станции (см. schema.py): состояние блоков - int8, цены,
+# мощности и погода - float32, показатели станций остаются float64
+compact_columns  = [rsv, tut, capacity_station, temp_max, temp_min, temp_avg, wind_speed, temp_effective]
+compact_prefixes = ["Установленная мощность блока", "Минимум блока"]
+key_columns      = [col1, col2, 'Город', 'Наименование ГТП генерации']
+
+# Исходные DataFrame, общие для всех станций. Заполняются в main()
+# до запуска пула процессов и наследуются дочерними процессами при fork
+src_rsv          = "Цены РСВ"
+src_hc           = "Исторический состав"
+src_si           = "Показатели станций"
+src_tut          = "Цена т.у.т."
+src_ref          = "Справочник"
+src_capacity     = "Мощность"
+src_weather      = "Погода"
+sources          = {}
+
+# Ключи справочных данных (перечень электростанций и погода)
+ref_stations     = "Перечень электростанций"
+ref_weather      = "Погода"
+ref_station_city = "Станция:Город"
 
+@lru_cache(maxsize=None)
 def normalize_column_name(name):
     """
     Функция для нормализации названий столбцов:
@@ -87,153 +140,372 @@ def normalize_column_name(name):
         return re.sub(r'[^\w\s]', '', normalized).replace(" ", "").lower()
     return name  # На случай, если name не строка
 
+@lru_cache(maxsize=None)
+def _normalized_column_map(columns):
+    """
+    Возвращает словарь вида 'нормализованное имя':'имя столбца'.\n
+    Кэшируется по набору столбцов, поэтому для одного DataFrame\n
+    нормализация выполняется один раз. При совпадении нормализованных\n
+    имён берётся первый столбец.
+    """
+    column_map = {}
+    for col in columns:
+        column_map.setdefault(normalize_column_name(col), col)
+    return column_map
+
+def find_station_column(df, station_name):
+    """
+    Возвращает оригинальное имя столбца станции в DataFrame\n
+    или None, если такой станции нет.
+    """
+    return _normalized_column_map(tuple(df.columns)).get(normalize_column_name(station_name))
+
+def station_schema(df):
+    """
+    Приводит столбцы данных станции к компактным типам (на месте).
+    """
+    return apply_schema(df, block_columns, compact_columns, compact_prefixes, key_columns, [date])
+
+def station_keys(values):
+    """
+    Возвращает нормализованные имена станций категориальным столбцом.\n
+    Нормализация выполняется один раз по уникальным значениям.
+    """
+    names = {name: normalize_column_name(name) for name in values.dropna().unique()}
+    return values.map(names).astype('category')
+
+def partition_by_station(df, station_col):
+    """
+    Разбивает DataFrame на части по станциям за один проход groupby.\n
+    Ключ группировки - нормализованное имя станции (категориальный).\n
+    Возвращает словарь вида 'нормализованное имя станции':DataFrame.
+
+    Аргументы:
+        df (pd.DataFrame): Полный DataFrame с данными.
+        station_col (str): Столбец с именем станции.
+    """
+    return {key: part for key, part in df.groupby(station_keys(df[station_col]), observed=True, sort=False)}
+
+def steps_per_day(step):
+    """
+    Возвращает количество шагов времени в сутках (24 для 'h', 1 для 'D').
+    """
+    return pd.Timedelta(days=1) // pd.Timedelta(1, unit=step)
+
+def expand_periods(df, start_col, freq, step='h'):
+    """
+    Разворачивает строки, описывающие период (сутки, месяц, год),\n
+    в строки с шагом step без циклов Python: каждая строка повторяется\n
+    столько раз, сколько шагов в её периоде (np.repeat), а в столбец\n
+    'Дата' записывается начало периода плюс смещение в шагах.\n
+    Если период равен шагу (сутки по суткам), строки остаются как есть.
+
+    Аргументы:
+        df (pd.DataFrame): DataFrame, одна строка которого - один период.
+        start_col (str): Столбец с началом периода.
+        freq (str): Длина периода - 'D' (сутки), 'MS' (месяц), 'YS' (год).
+        step (str): Шаг результата - 'h' (час) или 'D' (сутки).
+    """
+    starts = pd.DatetimeIndex(df[start_col])
+    ends = starts + pd.tseries.frequencies.to_offset(freq)
+    steps = ((ends - starts) // pd.Timedelta(1, unit=step)).to_numpy(dtype=np.int64)
+
+    # Номер исходной строки и смещение в шагах внутри её периода
+    positions = np.repeat(np.arange(len(df)), steps)
+    offsets = np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)
+
+    df_expanded = df.iloc[positions].reset_index(drop=True)
+    df_expanded[date] = starts.to_numpy()[positions] + offsets * np.timedelta64(1, step)
+    return df_expanded
+
+@instrument.timed()
 def create_rsv_dataframe():
     """
     Извлекает данные из файла "Цены РСВ" и создаёт датафрейм по нему.
     """
     try:
-        df = pd.read_excel(rsv_prices)
+        df = read_excel(rsv_prices)
         # Преобразование столбца 'Дата' в формат datetime с округлением до часа
         df[date] = pd.to_datetime(df[date], format='%d.%m.%Y %H:%M').dt.floor('h')
-        return df
+        # Цены по станциям - float32
+        return apply_schema(df, compact=[col for col in df.columns if col != date])
     
     except Exception as e:
         print("Ошибка при создании начального DataFrame - Цены РСВ:", e)
         traceback.print_exc()
         raise e
     
-def create_historical_compos_dataframe():
+def concat_partitions(parts):
     """
-    Извлекает данные из файла "Исторический состав", собирает дату из столбцов\n
-    "Месяц", "Число", "Час" и имени листа (год), и добавляет их в датафрейм
+    Склеивает накопленные по блокам части в словарь вида Станция:DataFrame.
+    """
+    return {key: pd.concat(chunks, ignore_index=True) for key, chunks in parts.items()}
+
+@instrument.timed()
+def create_historical_compos_partitions():
+    """
+    Потоково читает файл "Исторический состав" (листы с '_ч' в конце имени)\n
+    блоками строк, собирает дату из столбцов "Месяц", "Число", "Час" и имени\n
+    листа (год) и сразу раскладывает каждый блок по станциям. Кроме\n
+    результата, в памяти одновременно находится только один блок.\n
+    Возвращает словарь вида 'нормализованное имя станции':DataFrame\n
+    (Дата и блоки 1-10).
     """
     try:
-        xls = pd.ExcelFile(historical_compos)
-        
-        dataframes = []
-        # Обрабатываем только листы с '_ч' в конце имени
-        for sheet_name in xls.sheet_names:
+        parts = {}
+        for sheet_name in sheet_names(historical_compos):
             if sheet_name.endswith('_ч'):
                 # Извлечение года из имени листа
                 year = int(sheet_name.split('_')[0])
-                df = pd.read_excel(xls, sheet_name=sheet_name)
-                
-                # Создаем новый столбец с полной датой
-                df[date] = pd.to_datetime({
-                    'year': [year] * len(df),
-                    'month': df['МЕСЯЦ'],
-                    'day': df['Число'],
-                    'hour': df['Час']
-                }).dt.floor('h')
-
-                df_filtered = df[[date, col1, '1', '2', '3', '4', '5', '6', '7', '8', '9', '10']]
-                dataframes.append(df_filtered)
-
-        full_df = pd.concat(dataframes, ignore_index=True)
-        return full_df
+                for df in iter_excel(historical_compos, sheet_name, columns=['МЕСЯЦ', 'Число', 'Час', col1, *hc_blocks]):
+                    # Создаем новый столбец с полной датой
+                    df[date] = pd.to_datetime({
+                        'year': year,
+                        'month': df['МЕСЯЦ'],
+                        'day': df['Число'],
+                        'hour': df['Час']
+                    }).dt.floor('h')
+
+                    df = apply_schema(df[[date, col1, *hc_blocks]].copy(), blocks=hc_blocks)
+                    for key, part in partition_by_station(df, col1).items():
+                        parts.setdefault(key, []).append(part.drop(columns=col1))
+
+        return concat_partitions(parts)
     
     except Exception as e:
         print("Ошибка при создании начального DataFrame - Исторический состав:", e)
         raise e
     
-def create_station_indicators_dataframe():
+@instrument.timed()
+def create_station_indicators_partitions():
     """
-    Извлекает данные из файла "Показатели станций", собирает дату из столбцов,
-    добавляет её в датафрейм вместе с остальными атрибутами/значениями.\n
-    Производит пивотирование данных с индексами Дата и Column2.
+    Потоково читает файл "Показатели станций" блоками строк, собирает дату\n
+    из столбцов и пивотирует каждый блок на уровне суток (Дата и станция\n
+    против атрибутов), раскладывая результат по станциям. Значения\n
+    остаются суточными - до часов они разворачиваются только при\n
+    извлечении одной станции в почасовом разрешении (get_si_by_name).\n
+    Возвращает словарь вида 'нормализованное имя станции':DataFrame.
     """
     try:
-        df = pd.read_excel(station_indicators)
-        # Повторение каждой строки 24 раза (для каждого часа)
-        df_expanded = df.loc[df.index.repeat(24)].reset_index(drop=True)
-        # Генерация столбца с часами от 0 до 23
-        df_expanded['Час'] = np.tile(range(24), len(df_expanded) // 24 + 1)[:len(df_expanded)]
-        # Создаем новый столбец с полной датой
-        df_expanded[date] = pd.to_datetime({
-            'year': df_expanded['Год'],
-            'month': df_expanded['Месяц'],
-            'day': df_expanded['День'],
-            'hour': df_expanded['Час']
-        }).dt.floor('h')
-
-        # Пивотирование данных
-        pivot_df = df_expanded.pivot_table(
-        index=[date, col2],  # Индексы
-        columns='Атрибут',   # Столбец для создания столбцов в новом DataFrame
-        values='Значение',   # Значения, которые будут заполнены
-        aggfunc='sum'        # Функция агрегирования
-        ).reset_index()  # Сброс индекса для уникализации
-        
-        # Убираем проблемы из всех столбцов со значениями
-        columns_to_process = [gen_energy, own_use_pct, own_use_gen, fuel_cons_el, 
-                    fuel_cons_rel, heat_rel, own_use_heat1, own_use_heat2,  
-                    fuel_cons_ht, fuel_cons_ht_rel, rel_from_bus, total_fuel_cons]
-        for col in columns_to_process:
-            # Преобразование в числа и деление на 24 для распределения значений по часам
-            pivot_df[col] = pivot_df[col].astype(str).str.replace(' ', '').str.replace('\xa0', '').str.replace(',', '.').astype(float) / 24
-        return pivot_df[[date, col2] + columns_to_process]
+        parts = {}
+        columns = ['Год', 'Месяц', 'День', col2, 'Атрибут', 'Значение']
+        for df in iter_excel(station_indicators, columns=columns):
+            # Создаем новый столбец с датой (сутки)
+            df[date] = pd.to_datetime({
+                'year': df['Год'],
+                'month': df['Месяц'],
+                'day': df['День']
+            })
+            # Значения - числа и строки вида '1 234,5': разбираем одним проходом до пивотирования
+            df['Значение'] = parse_numeric(df['Значение'])
+            df['Станция'] = station_keys(df[col2])
+
+            # Пивотирование блока на уровне суток
+            pivot_df = (df.groupby(['Станция', date, 'Атрибут'], observed=True, sort=True)['Значение']
+                        .sum()
+                        .unstack('Атрибут'))
+            for key, part in pivot_df.groupby(level='Станция', observed=True, sort=False):
+                parts.setdefault(key, []).append(part.droplevel('Станция'))
+
+        partitions = {}
+        for key, chunks in parts.items():
+            # Сутки станции могут оказаться на границе блоков - суммируем части
+            daily = pd.concat(chunks).groupby(level=date, sort=True).sum(min_count=1)
+            daily = daily.reindex(columns=indicator_columns)
+            daily.columns.name = None
+            partitions[key] = daily.reset_index()
+        return partitions
 
     except Exception as e:
         print(f"Ошибка при создании начального DataFrame - Показатели станций: {e}")
         raise e
     
+@instrument.timed()
 def create_tut_dataframe():
     """
-    Извлекает данные из файла "Цена т.у.т.", собирает дату из столбцов,
-    добавляет к ней распределение по дням и часам и записывает её в датафрейм.
+    Извлекает данные из файла "Цена т.у.т." и собирает дату (начало\n
+    месяца) из столбцов "Год" и "Месяц". Данные остаются помесячными -\n
+    до часов или суток они разворачиваются при извлечении одной станции\n
+    (get_tut_by_name).
     """
     try:
-        df = pd.read_excel(price_tut)
-        # Преобразуем данные 'Год' и 'Месяц' в строки
-        df['Год-Месяц'] = pd.to_datetime(df[['Год', 'Месяц']].astype(str).agg('-'.join, axis=1))
-        
-        # Создаем полный диапазон часов для каждого месяца
-        full_data = []
-        for _, row in df.iterrows():
-            # Начало и конец месяца
-            start_date = row['Год-Месяц']
-            # Получаем количество дней в месяце
-            month_days = calendar.monthrange(start_date.year, start_date.month)[1]
-            # Создаем временной диапазон для каждого дня
-            for day in range(1, month_days + 1):
-                day_date = start_date.replace(day=day)
-                hourly_range = pd.date_range(start=day_date, end=day_date + pd.Timedelta(days=0, hours=23), freq='h')
-                for time in hourly_range:
-                    new_row = row.copy()
-                    new_row[date] = time.floor('h')
-                    full_data.append(new_row)
-
-        df_hourly = pd.DataFrame(full_data)
-        return df_hourly.drop(columns=['Год-Месяц', 'Год', 'Месяц'])
+        df = read_excel(price_tut)
+        df.insert(0, date, pd.to_datetime({'year': df['Год'], 'month': df['Месяц'], 'day': 1}))
+        df = df.drop(columns=['Год', 'Месяц'])
+        # Цены по станциям - float32
+        return apply_schema(df, compact=[col for col in df.columns if col != date])
 
     except Exception as e:
         print(f"Ошибка при создании начального DataFrame - Цена т.у.т.: {e}")
         raise e
 
-def get_rsv_by_name(df, station_name):
+@instrument.timed()
+def create_composition_forecast_partitions():
+    """
+    Извлекает данные из файла "Состав на прогноз" (листы - годы, строки -\n
+    сутки станции: "МЕСЯЦ", "Число" и блоки 1-10) и раскладывает их по\n
+    станциям. Состояние блока задано на сутки, поэтому значение - часы\n
+    в работе за сутки: части в том же формате, что у\n
+    create_historical_compos_partitions() после get_hs_by_name(step='D').\n
+    Возвращает словарь вида 'нормализованное имя станции':DataFrame.
+    """
+    try:
+        parts = {}
+        for sheet_name in sheet_names(composition_forecast):
+            if not sheet_name.isdigit():
+                continue
+            df = read_excel(composition_forecast, sheet_name, columns=['МЕСЯЦ', 'Число', col1, *hc_blocks])
+            df = df.dropna(subset=['МЕСЯЦ', 'Число', col1])
+            df[date] = pd.to_datetime({
+                'year': int(sheet_name),
+                'month': df['МЕСЯЦ'].astype(int),
+                'day': df['Число'].astype(int)
+            })
+
+            df = apply_schema(df[[date, col1, *hc_blocks]].copy(), blocks=hc_blocks)
+            df[hc_blocks] = df[hc_blocks] * steps_per_day('h')
+            for key, part in partition_by_station(df, col1).items():
+                parts.setdefault(key, []).append(part.drop(columns=col1))
+
+        return concat_partitions(parts)
+
+    except Exception as e:
+        print(f"Ошибка при создании начального DataFrame - Состав на прогноз: {e}")
+        raise e
+
+@instrument.timed()
+def create_tut_forecast_dataframe():
+    """
+    Извлекает данные из файла "Цена т.у.т. на прогноз" (строки - станции,\n
+    столбцы - месяцы, номера месяцев в первой строке) и приводит их к\n
+    формату create_tut_dataframe(): 'Дата' (начало месяца) и столбец на\n
+    каждую станцию, поэтому цена станции извлекается get_tut_by_name().
+    """
+    try:
+        df = read_excel(price_tut_forecast)
+        # Столбец с именами станций - единственный текстовый
+        station_col = next(col for col in df.columns if df[col].map(lambda value: isinstance(value, str)).any())
+        months = df[df[station_col].isna()].iloc[0].drop(station_col).dropna()
+
+        prices = df.dropna(subset=[station_col]).set_index(station_col)[months.index]
+        prices = prices.apply(parse_numeric).T
+        prices.insert(0, date, pd.to_datetime({
+            'year': price_tut_forecast_year,
+            'month': months.astype(int).to_numpy(),
+            'day': 1
+        }).to_numpy())
+        prices.columns.name = None
+        prices = prices.reset_index(drop=True)
+        return apply_schema(prices, compact=[col for col in prices.columns if col != date])
+
+    except Exception as e:
+        print(f"Ошибка при создании начального DataFrame - Цена т.у.т. на прогноз: {e}")
+        raise e
+
+@instrument.timed()
+def create_reference_data():
+    """
+    Загружает справочные данные один раз на весь запуск:\n
+    перечень электростанций по всем годам, погоду по всем городам\n
+    и индекс вида Станция:Город, построенный за один проход.
+    """
+    try:
+        dfs = []
+        for sheet_name in sheet_names(power_station_list):
+            try:
+                year = int(sheet_name)
+                df = read_excel(power_station_list, sheet_name=sheet_name)
+                df['Год'] = year
+                dfs.append(df)
+            except ValueError:
+                print(f"Пропущен лист '{sheet_name}', так как его название не является годом.")
+                continue
+        stations_df = apply_schema(pd.concat(dfs, ignore_index=True), keys=key_columns)
+
+        # Первый встреченный город для каждой станции
+        station_city = stations_df.drop_duplicates('Наименование ГТП генерации')
+        station_city = dict(zip(station_city['Наименование ГТП генерации'], station_city['Город']))
+
+        weather_dfs = {}
+        for city_name in sheet_names(weather):
+            weather_data = read_excel(weather, sheet_name=city_name)
+            weather_data.columns = weather_data.columns.map(normalize_column_name)
+            weather_dfs[city_name] = weather_data
+
+        return {
+            ref_stations: stations_df,
+            ref_weather: weather_dfs,
+            ref_station_city: station_city,
+        }
+
+    except Exception as e:
+        print(f"Ошибка при загрузке справочных данных - Перечень электростанций, Погода: {e}")
+        raise e
+
+# Построители исходных DataFrame вида Источник:Функция. Каждый читает свою
+# книгу и не зависит от остальных, поэтому они строятся одновременно (load_sources)
+source_builders = {
+    src_rsv: create_rsv_dataframe,                        # DataFrame РСВ
+    src_hc: create_historical_compos_partitions,          # Ист. Состав по станциям
+    src_si: create_station_indicators_partitions,         # Суточные Показатели станций по станциям
+    src_tut: create_tut_dataframe,                        # Помесячная Цена т.у.т
+    src_ref: create_reference_data,                       # Справочник станций и погоды
+}
+
+def load_sources(workers=1):
+    """
+    Строит все исходные DataFrame (sources). Книги независимы, поэтому\n
+    при workers > 1 построители запускаются одновременно в пуле процессов,\n
+    и время загрузки близко к самой долгой книге, а не к сумме всех.\n
+    Результат тот же, что при последовательной загрузке.
+
+    Аргументы:
+        workers (int): Количество процессов.
+    """
+    workers = min(workers, len(source_builders))
+    if workers > 1 and 'fork' not in mp.get_all_start_methods():
+        workers = 1
+
+    if workers <= 1:
+        for key, builder in source_builders.items():
+            sources[key] = builder()
+        return sources
+
+    with instrument.stage('load_sources'):
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork')) as pool:
+            futures = {key: pool.submit(builder) for key, builder in source_builders.items()}
+            for key, future in futures.items():
+                sources[key] = future.result()
+    return sources
+
+@instrument.timed()
+def get_rsv_by_name(df, station_name, step='h'):
     """
     Возвращает новый DataFrame Цены РСВ по имени станции\n
-    из DataFrame в формате 'Дата' и 'Цена РСВ'.
+    из DataFrame в формате 'Дата' и 'Цена РСВ'. Цены почасовые,\n
+    в суточном разрешении берётся средняя цена за сутки.
     
     Аргументы
         df (pd.DataFrame): DataFrame, содержащий данные.
         station_name (str): Имя станции, данные которой нужно извлечь.
+        step (str): Шаг времени - 'h' (час) или 'D' (сутки).
     """
     try:
-        normalized_station_name = normalize_column_name(station_name)
-        normalized_columns = [normalize_column_name(col) for col in df.columns]
-        if normalized_station_name in normalized_columns:
-            # Определяем оригинальное имя столбца
-            original_station_name = df.columns[normalized_columns.index(normalized_station_name)]
+        # Определяем оригинальное имя столбца
+        original_station_name = find_station_column(df, station_name)
+        if original_station_name is not None:
             # Проверяем, что оба столбца ('Дата' и station_name) существуют и корректны
             if date not in df.columns:
                 raise ValueError("Столбец 'Дата' не найден в DataFrame.")
             
             # Создаём новый DataFrame с извлечёнными данными
-            return pd.DataFrame({
+            rsv_df = pd.DataFrame({
                 date: df[date],
                 rsv: df[original_station_name]
             })
+            if step != 'h':
+                rsv_df = rsv_df.groupby(rsv_df[date].dt.floor(step), sort=True)[[rsv]].mean().reset_index()
+            return rsv_df
         else:
             print(f"Станция '{station_name}' не найдена в DataFrame.")
             return None
@@ -242,19 +514,24 @@ def get_rsv_by_name(df, station_name):
         print(f"Ошибка при извлечении '{station_name}' - Цена РСВ: {e}")
         return None
 
-def get_hs_by_name(df, station_name):
+@instrument.timed()
+def get_hs_by_name(partitions, station_name, step='h'):
     """
     Возвращает новый DataFrame Исторический состав по имени станции\n
-    из DataFrame в формате Дата и блоки (1-10).
+    из DataFrame в формате Дата и блоки (1-10). Состав почасовой,\n
+    в суточном разрешении для блока указывается число часов в работе.
     
     Аргументы
-        df (pd.DataFrame): DataFrame, содержащий данные.
+        partitions (dict): Части DataFrame по станциям из create_historical_compos_partitions().
         station_name (str): Имя станции, данные которой нужно извлечь.
+        step (str): Шаг времени - 'h' (час) или 'D' (сутки).
     """
     try:
-        filtered_df = df[df[col1].apply(normalize_column_name) == normalize_column_name(station_name)]
+        filtered_df = partitions.get(normalize_column_name(station_name))
 
-        if not filtered_df.empty:
+        if filtered_df is not None and not filtered_df.empty:
+            if step != 'h':
+                filtered_df = filtered_df.groupby(filtered_df[date].dt.floor(step), sort=True)[hc_blocks].sum().reset_index()
             return pd.DataFrame({
                     date: filtered_df[date],
                     block1: filtered_df['1'],
@@ -276,20 +553,25 @@ def get_hs_by_name(df, station_name):
         print(f"Ошибка при извлечении '{station_name}' - Исторический состав: {e}")
         return None
 
-def get_si_by_name(df, station_name):
+@instrument.timed()
+def get_si_by_name(partitions, station_name, step='h'):
     """
     Возвращает новый DataFrame Показатели станций с данными по имени\n
-    станции, в формате Дата, Атрибуты - Значения
+    станции, в формате Дата, Атрибуты - Значения. Показатели суточные,\n
+    в почасовом разрешении значение суток делится поровну между часами.
     
     Аргументы:
-        df (pd.DataFrame): Полный DataFrame с данными.
+        partitions (dict): Суточные данные по станциям из create_station_indicators_partitions().
         station_name (str): Имя станции, данные которой нужно извлечь.
+        step (str): Шаг времени - 'h' (час) или 'D' (сутки).
     """
     try:
-        filtered_df = df[df[col2].apply(normalize_column_name) == normalize_column_name(station_name)]
+        daily_df = partitions.get(normalize_column_name(station_name))
 
-        if not filtered_df.empty:
-            # Возврат датафрейма без столбца с именем станции (col2)
+        if daily_df is not None and not daily_df.empty:
+            # Повторение каждой суточной строки для каждого шага суток
+            filtered_df = expand_periods(daily_df, date, 'D', step)
+            filtered_df[indicator_columns] /= steps_per_day(step)
             return pd.DataFrame({
                 date: filtered_df[date],
                 gen_energy: filtered_df[gen_energy],
@@ -313,26 +595,28 @@ def get_si_by_name(df, station_name):
         print(f"Ошибка при извлечении '{station_name}' - Показатели станций: {e}")
         return None
     
-def get_tut_by_name(df, station_name):
+@instrument.timed()
+def get_tut_by_name(df, station_name, step='h'):
     """
     Возвращает срез начального DataFrame Цена т.у.т. с данными по имени\n
     станции, в формате Дата и Цена т.у.т., заранее переименовав столбец\n
-    по имени станции на "Цена т.у.т.".
+    по имени станции на "Цена т.у.т.". Помесячная цена повторяется\n
+    для каждого шага месяца.
     
     Аргументы:
-        df (pd.DataFrame): Полный DataFrame с данными.
+        df (pd.DataFrame): Полный DataFrame с данными (по месяцам).
         station_name (str): Имя станции, данные которой нужно извлечь.
+        step (str): Шаг времени - 'h' (час) или 'D' (сутки).
     """
     try:
-        normalized_station_name = normalize_column_name(station_name)
-        normalized_columns = [normalize_column_name(col) for col in df.columns]
-        if normalized_station_name in normalized_columns:
-            original_station_name = df.columns[normalized_columns.index(normalized_station_name)]
+        original_station_name = find_station_column(df, station_name)
+        if original_station_name is not None:
             if date not in df.columns:
                 raise ValueError("Столбец 'Дата' не найден в DataFrame.")
             
-            # Возвращаем срез DataFrame и переименовываем столбец station_name
-            return df[[date, original_station_name]].dropna().rename(columns={original_station_name: tut})
+            # Срез DataFrame с переименованным столбцом station_name, развёрнутый до шага
+            monthly_df = df[[date, original_station_name]].dropna().rename(columns={original_station_name: tut})
+            return expand_periods(monthly_df, date, 'MS', step)
         else:
             print(f"Станция '{station_name}' не найдена в DataFrame.")
             return None
@@ -341,156 +625,549 @@ def get_tut_by_name(df, station_name):
         print(f"Ошибка при извлечении '{station_name}' - Цена т.у.т: {e}")
         return None
     
-def get_capacity_by_name(station_name):
+@instrument.timed()
+def get_capacity_by_name(ref_data, station_name, step='h'):
     """
     Возвращает данные по установленной и минимальной мощности блоков,\n
-    а также мощность всей станции в МВт.
+    а также мощность всей станции в МВт. Годовые значения повторяются\n
+    для каждого шага года и, как показатели станций, делятся поровну\n
+    между шагами суток (в суточном разрешении - без деления).
 
     Аргументы:
+        ref_data (dict): Справочные данные из create_reference_data().
         station_name (str): Имя станции, данные которой нужно извлечь.
+        step (str): Шаг времени - 'h' (час) или 'D' (сутки).
     """
     try:
-        global city_gtp_dict
-        xls = pd.ExcelFile(power_station_list)
-        sheet_names = xls.sheet_names
-        dfs = []
-
-        for sheet_name in sheet_names:
-            try:
-                year = int(sheet_name)
-                df = pd.read_excel(xls, sheet_name=sheet_name)
-                df['Год'] = year
-                dfs.append(df)
-            except ValueError:
-                print(f"Пропущен лист '{sheet_name}', так как его название не является годом.")
-                continue
-        
-        data = pd.concat(dfs, ignore_index=True)
+        data = ref_data[ref_stations]
         data_station = data[data['Наименование ГТП генерации'] == station_name].copy()
         
         if data_station.empty:
             raise ValueError(f"Станция с названием '{station_name}' не найдена в данных.")
-        
-        city_gtp_dict = data[data['Наименование ГТП генерации'] == station_name][['Город', 'Наименование ГТП генерации']].drop_duplicates().set_index('Город')['Наименование ГТП генерации'].to_dict()
-
-        hourly_data = []
-        for year in data['Год'].unique():
-            start_date = datetime(year, 1, 1)
-            end_date = datetime(year, 12, 31, 23)
-            date_range = pd.date_range(start=start_date, end=end_date, freq='h')
-            year_data = data_station[data_station['Год'] == year]
-            station_power = year_data['установленная мощность станции, МВт'].iloc[0] / 24
-
-            block_data = []
-            for idx, row in year_data.iterrows():
-                block_info = {
-                    f"Установленная мощность блока {row['Ген.оборудование']}, МВт": row['установленная мощность, МВт'] / 24,
-                    f"Минимум блока {row['Ген.оборудование']}, МВт": row['минимум'] / 24
-                }
-                block_data.append(block_info)
-            
-            hourly_df = pd.DataFrame(index=date_range)
-            hourly_df[date] = date_range
-            hourly_df[capacity_station] = station_power
-            
-            for block_info in block_data:
-                for col, value in block_info.items():
-                    hourly_df[col] = value
-            hourly_data.append(hourly_df)
-        
-        result_df = pd.concat(hourly_data).reset_index(drop=True)
+
+        years = data['Год'].unique()
+        missing_years = set(years) - set(data_station['Год'])
+        if missing_years:
+            raise ValueError(f"Нет данных по станции '{station_name}' за годы: {sorted(missing_years)}.")
+
+        # Мощность станции - по первой строке каждого года
+        per_day = steps_per_day(step)
+        yearly_df = data_station.groupby('Год', sort=False)['установленная мощность станции, МВт'].first().reindex(years) / per_day
+        yearly_df = yearly_df.rename(capacity_station).to_frame()
+
+        # Мощность и минимум блоков в длинном формате: по два столбца на блок
+        equip = data_station['Ген.оборудование'].astype(str).to_numpy()
+        blocks = pd.DataFrame({
+            'Год': np.repeat(data_station['Год'].to_numpy(), 2),
+            'Столбец': np.column_stack([
+                "Установленная мощность блока " + equip + ", МВт",
+                "Минимум блока " + equip + ", МВт"
+            ]).ravel(),
+            'Значение': np.column_stack([
+                data_station['установленная мощность, МВт'].to_numpy() / per_day,
+                data_station['минимум'].to_numpy() / per_day
+            ]).ravel()
+        }).drop_duplicates(['Год', 'Столбец'], keep='last')
+        block_columns = blocks['Столбец'].unique()
+        blocks = blocks.pivot(index='Год', columns='Столбец', values='Значение')[block_columns]
+
+        yearly_df = yearly_df.join(blocks)
+        yearly_df[date] = pd.to_datetime({'year': yearly_df.index, 'month': 1, 'day': 1}).to_numpy()
+
+        result_df = expand_periods(yearly_df, date, 'YS', step)
+        result_df = result_df[[date, capacity_station, *block_columns]]
         result_df.fillna(0, inplace=True)
-        return result_df
+        return station_schema(result_df)
     
     except Exception as e:
         print(f"Ошибка при обработке данных станции '{station_name}': {e}")
         return None
 
-def get_weather_by_name(station_name):
+@instrument.timed()
+def get_weather_by_name(ref_data, station_name, step='h'):
     """
-    Возвращает данные по погоде для города, соответствующего указанной станции.
+    Возвращает данные по погоде для города, соответствующего указанной станции.\n
+    Погода суточная, в почасовом разрешении повторяется для каждого часа.
     
     Аргументы:
+        ref_data (dict): Справочные данные из create_reference_data().
         station_name (str): Имя станции, данные которой нужно извлечь.
+        step (str): Шаг времени - 'h' (час) или 'D' (сутки).
     """
     try:
-        city_name = next((city for city, station in city_gtp_dict.items() if station == station_name), None)
+        city_name = ref_data[ref_station_city].get(station_name)
         if not city_name:
             print(f"Город для станции '{station_name}' не найден в словаре.")
             return pd.DataFrame()
 
-        xls_weather = pd.ExcelFile(weather)
-        if city_name not in xls_weather.sheet_names:
+        weather_data = ref_data[ref_weather].get(city_name)
+        if weather_data is None:
             print(f"Погодные данные для города '{city_name}' отсутствуют.")
             return pd.DataFrame()
 
-        weather_data = pd.read_excel(xls_weather, sheet_name=city_name)
-        weather_data.columns = weather_data.columns.map(normalize_column_name)
-        hourly_weather_data = []
-        for _, row in weather_data.iterrows():
-            day_date = pd.to_datetime(row["дата"])
-            for hour in range(24):
-                hourly_weather_data.append({
-                    date: day_date + timedelta(hours=hour),
-                    temp_max: row["максимальнаятемпература"],
-                    temp_min: row["минимальнаятемпература"],
-                    temp_avg: row["средняятемпература"],
-                    wind_speed: row["скоростьветра"],
-                    #precipitation: row["осадки"],
-                    temp_effective: row["эффективнаятемпература"]
-                })
-
-        hourly_weather_df = pd.DataFrame(hourly_weather_data)
-        return hourly_weather_df
+        daily_weather_df = pd.DataFrame({
+            date: pd.to_datetime(weather_data["дата"]),
+            temp_max: weather_data["максимальнаятемпература"],
+            temp_min: weather_data["минимальнаятемпература"],
+            temp_avg: weather_data["средняятемпература"],
+            wind_speed: weather_data["скоростьветра"],
+            #precipitation: weather_data["осадки"],
+            temp_effective: weather_data["эффективнаятемпература"]
+        })
+
+        return expand_periods(station_schema(daily_weather_df), date, 'D', step)
 
     except Exception as e:
         print(f"Ошибка при получении погодных данных для станции '{station_name}': {e}")
         return None
 
-def main():
+@instrument.timed()
+def write_parquet(df, station, resolution='hourly'):
+    """
+    Сохраняет данные станции в Parquet (формат по умолчанию)\n
+    с типами из схемы (station_schema).
+    """
+    file_path = output_path('parquet', station, resolution)
+    station_schema(df).to_parquet(file_path, index=False)
+    return file_path
+
+@instrument.timed()
+def write_excel(df, station, resolution='hourly'):
+    """
+    Сохраняет данные станции в Excel (выгрузка по запросу).\n
+    Выключенные блоки записываются как '-', как в исходных книгах.
+    """
+    df = df.assign(**{
+        col: df[col].astype(object).where(df[col] != 0, '-')
+        for col in block_columns if col in df.columns
+    })
+    file_path = output_path('excel', station, resolution)
+    df.to_excel(file_path, index=False)
+    return file_path
+
+# Форматы выходных файлов step2__ingest
+output_writers = {
+    'parquet': write_parquet,
+    'excel': write_excel,
+}
+
+# Расширения и чтение уже сохранённых файлов (для дописывания новых строк)
+output_extensions = {
+    'parquet': 'parquet',
+    'excel': 'xlsx',
+}
+output_readers = {
+    'parquet': lambda station, resolution='hourly': pd.read_parquet(output_path('parquet', station, resolution)),
+    'excel': lambda station, resolution='hourly': station_schema(pd.read_excel(output_path('excel', station, resolution))),
+}
+
+def output_path(fmt, station, resolution='hourly'):
+    """
+    Возвращает путь к выходному файлу станции в заданном формате и разрешении.
+    """
+    return os.path.join(resolution_dirs[resolution], f"{station}.{output_extensions[fmt]}")
+
+def build_station_frames(station, step='h'):
+    """
+    Возвращает исходные данные по станции в виде словаря вида\n
+    Источник:DataFrame (только непустые источники). Каждый источник\n
+    хранится в своём разрешении и приводится к шагу step только здесь:\n
+    для суточного шага почасовые источники агрегируются, а суточные,\n
+    месячные и годовые не разворачиваются до часов.
+
+    Аргументы:
+        station (str): Имя станции.
+        step (str): Шаг времени - 'h' (час) или 'D' (сутки).
+    """
+    frames = {
+        src_rsv: get_rsv_by_name(sources[src_rsv], station, step),
+        src_hc: get_hs_by_name(sources[src_hc], station, step),
+        src_si: get_si_by_name(sources[src_si], station, step),
+        src_tut: get_tut_by_name(sources[src_tut], station, step),
+        src_capacity: get_capacity_by_name(sources[src_ref], station, step),
+        src_weather: get_weather_by_name(sources[src_ref], station, step)
+    }
+    # Фильтруем только те датафреймы, которые не являются None и не пустые
+    return {key: df for key, df in frames.items() if df is not None and not df.empty}
+
+def merge_station_frames(frames):
+    """
+    Объединяет исходные данные станции по дате и считает стоимость т.у.т.\n
+    Сначала находится пересечение меток времени всех источников, затем\n
+    каждый источник выравнивается по общему отсортированному индексу,\n
+    без построения объединения всех меток. Строки с пропусками\n
+    отбрасываются, как и столбцы, пустые во всём источнике.\n
+    Возвращает объединённый DataFrame и отчёт об отброшенных строках\n
+    вида Источник:{'rows': всего, 'outside': нет метки в других\n
+    источниках, 'missing': есть пропуски в значениях}.
+
+    Аргументы:
+        frames (dict): Исходные данные станции из build_station_frames().
+    """
+    sources_index = {}
+    sources_columns = {}
+    for key, df in frames.items():
+        index = pd.DatetimeIndex(df[date])
+        if not index.is_monotonic_increasing:
+            df = df.sort_values(date, kind='stable')
+            index = pd.DatetimeIndex(df[date])
+        if not index.is_unique:
+            raise ValueError(f"Повторяющиеся метки времени в источнике '{key}'.")
+        columns = [col for col in df.columns if col != date and df[col].notna().any()]
+        if columns:
+            # Источник без значений не ограничивает общий диапазон
+            sources_index[key] = (df, index)
+            sources_columns[key] = columns
+
+    if not sources_index:
+        return pd.DataFrame(columns=[date]), {}
+
+    # Общий диапазон и пересечение отсортированных меток
+    start = max(index[0] for _, index in sources_index.values())
+    end = min(index[-1] for _, index in sources_index.values())
+    common = None
+    for _, index in sources_index.values():
+        index = index[index.slice_indexer(start, end)]
+        common = index if common is None else common.intersection(index)
+
+    aligned = {date: common.to_numpy()}
+    missing = {}
+    for key, (df, index) in sources_index.items():
+        part = df.iloc[index.get_indexer(common)]
+        has_missing = part[sources_columns[key]].isna().any(axis=1).to_numpy()
+        missing[key] = has_missing
+        for col in sources_columns[key]:
+            aligned[col] = part[col].to_numpy()
+
+    keep = ~np.logical_or.reduce(list(missing.values())) if missing else np.ones(len(common), dtype=bool)
+    merged_df = pd.DataFrame(aligned)[keep].reset_index(drop=True)
+
+    dropped = {
+        key: {
+            'rows': len(frames[key]),
+            'outside': len(frames[key]) - len(common) if key in sources_index else len(frames[key]),
+            'missing': int(missing[key].sum()) if key in missing else 0,
+        }
+        for key in frames
+    }
+
+    station_schema(merged_df)
+    merged_df[multi_tut] = merged_df[total_fuel_cons] * merged_df[tut]
+    return merged_df, dropped
+
+def report_dropped(station, dropped):
+    """
+    Печатает, сколько строк каждого источника не попало в данные станции.
+    """
+    lines = [
+        f"{key} - {counts['outside'] + counts['missing']} из {counts['rows']} "
+        f"(нет в других источниках: {counts['outside']}, пропуски: {counts['missing']})"
+        for key, counts in dropped.items() if counts['outside'] or counts['missing']
+    ]
+    if lines:
+        print(f"Для '{station}' отброшены строки: " + "; ".join(lines))
+
+def station_city(station):
+    """
+    Возвращает город станции из справочных данных (sources) или None.
+    """
+    ref_data = sources.get(src_ref)
+    return ref_data[ref_station_city].get(station) if ref_data else None
+
+def source_hashes(frames, watermark):
+    """
+    Возвращает хэши исходных данных станции до водяного знака включительно.
+    """
+    return {key: frame_hash(df[df[date] <= watermark]) for key, df in frames.items()}
+
+def append_station_rows(frames, station, formats, state_entry):
+    """
+    Пытается дописать в файлы станции только строки после водяного знака.\n
+    Возвращает новое состояние станции или None, если нужна полная\n
+    пересборка (изменились данные до водяного знака, набор столбцов и т.п.).
+    """
+    if not state_entry or 'watermark' not in state_entry or sorted(state_entry['formats']) != sorted(formats):
+        return None
+    if not all(os.path.exists(output_path(fmt, station)) for fmt in formats):
+        return None
+
+    watermark = pd.Timestamp(state_entry['watermark'])
+    if source_hashes(frames, watermark) != state_entry['sources']:
+        print(f"Исторические данные по '{station}' изменились, файл будет пересобран полностью.")
+        return None
+
+    new_frames = {key: df[df[date] > watermark] for key, df in frames.items()}
+    if any(df.empty for df in new_frames.values()):
+        # Хотя бы в одном источнике нет новых строк - объединение будет пустым
+        print(f"Новых данных по '{station}' нет.")
+        return state_entry
+
+    with instrument.stage('merge_station_frames', station=station) as record:
+        new_rows, dropped = merge_station_frames(new_frames)
+        record['rows'] = len(new_rows)
+        record['frame_mb'] = frame_memory_mb(new_rows)
+    report_dropped(station, dropped)
+    if new_rows.empty:
+        print(f"Новых данных по '{station}' нет.")
+        return state_entry
+
+    existing = {fmt: output_readers[fmt](station) for fmt in formats}
+    if any(list(df.columns) != list(new_rows.columns) for df in existing.values()):
+        return None
+
+    for fmt, df in existing.items():
+        output_writers[fmt](pd.concat([df, new_rows], ignore_index=True), station)
+    print(f"Для '{station}' дописано строк: {len(new_rows)}.")
+
+    # В сводный куб добавляются итоги только новых строк
+    if not rollup.append_station(station, new_rows, station_city(station)):
+        all_rows = pd.concat([next(iter(existing.values())), new_rows], ignore_index=True)
+        rollup.write_station(station, all_rows, station_city(station))
+
+    new_watermark = new_rows[date].max()
+    return {
+        'watermark': str(new_watermark),
+        'sources': source_hashes(frames, new_watermark),
+        'formats': list(formats),
+        'dropped': dropped,
+    }
+
+def ingest_station_hourly(station, formats, state_entry=None):
+    """
+    Собирает почасовые данные по одной станции из общих исходных DataFrame\n
+    (sources), объединяет их по дате и сохраняет в файл. Если передано\n
+    состояние прошлой загрузки и данные до водяного знака не изменились,\n
+    в файлы дописываются только новые строки.\n
+    Возвращает новое состояние станции (то же state_entry, если новых\n
+    данных нет) или None, если по станции нет данных или у источников\n
+    нет общих отметок времени (файлы и состояние не записываются).
+
+    Аргументы:
+        station (str): Имя станции.
+        formats (list): Форматы выходных файлов (ключи output_writers).
+        state_entry (dict): Состояние станции после прошлой загрузки.
+    """
+    frames = build_station_frames(station, resolution_steps['hourly'])
+
+    if not frames:
+        return None
+
+    try:
+        if state_entry:
+            new_entry = append_station_rows(frames, station, formats, state_entry)
+            if new_entry is not None:
+                return new_entry
+
+        with instrument.stage('merge_station_frames', station=station) as record:
+            merged_df, dropped = merge_station_frames(frames)
+            record['rows'] = len(merged_df)
+            record['frame_mb'] = frame_memory_mb(merged_df)
+        report_dropped(station, dropped)
+        if merged_df.empty:
+            print(f"Предупреждение: у источников '{station}' нет общих отметок времени, станция пропущена.")
+            return None
+
+        file_paths = [output_writers[fmt](merged_df, station) for fmt in formats]
+        print(f"Данные для '{station}' сохранены как: {', '.join(file_paths)}")
+        rollup.write_station(station, merged_df, station_city(station))
+
+        watermark = merged_df[date].max()
+        return {
+            'watermark': str(watermark),
+            'sources': source_hashes(frames, watermark),
+            'formats': list(formats),
+            'dropped': dropped,
+        }
+
+    except Exception as e:
+        print(f"Ошибка при записи в файл информации по '{station}': {e}")
+        raise e
+
+def ingest_station_daily(station, formats):
+    """
+    Собирает суточные данные по одной станции и сохраняет их в файл\n
+    (step2__ingest/daily). Суточные источники берутся как есть,\n
+    почасовые агрегируются до суток, объединение - по общим суткам.\n
+    Файлы небольшие и всегда пересобираются полностью.\n
+    Возвращает отчёт об отброшенных строках или None, если по станции нет\n
+    данных или у источников нет общих дат.
+
+    Аргументы:
+        station (str): Имя станции.
+        formats (list): Форматы выходных файлов (ключи output_writers).
+    """
+    frames = build_station_frames(station, resolution_steps['daily'])
+
+    if not frames:
+        return None
+
+    try:
+        with instrument.stage('merge_station_frames_daily', station=station) as record:
+            daily_df, dropped = merge_station_frames(frames)
+            record['rows'] = len(daily_df)
+            record['frame_mb'] = frame_memory_mb(daily_df)
+        if daily_df.empty:
+            print(f"Предупреждение: у суточных источников '{station}' нет общих дат, суточный файл не записан.")
+            return None
+
+        file_paths = [output_writers[fmt](daily_df, station, 'daily') for fmt in formats]
+        print(f"Суточные данные для '{station}' сохранены как: {', '.join(file_paths)}")
+        return dropped
+
+    except Exception as e:
+        print(f"Ошибка при записи в файл суточной информации по '{station}': {e}")
+        raise e
+
+@instrument.timed()
+def ingest_station(station, formats=('parquet',), state_entry=None, resolutions=('hourly',)):
+    """
+    Собирает данные по одной станции в заданных разрешениях (почасовые -\n
+    ingest_station_hourly, суточные - ingest_station_daily). Суточные\n
+    файлы не пересобираются, если почасовые данные не изменились.\n
+    Возвращает новое состояние станции или None, если по станции нет данных.
+
+    Аргументы:
+        station (str): Имя станции.
+        formats (list): Форматы выходных файлов (ключи output_writers).
+        state_entry (dict): Состояние станции после прошлой загрузки.
+        resolutions (list): Разрешения выходных данных (ключи resolution_steps).
+    """
+    entry = {}
+    if 'hourly' in resolutions:
+        entry = ingest_station_hourly(station, formats, state_entry)
+        if entry is None:
+            return None
+
+    if 'daily' in resolutions:
+        unchanged = (entry is state_entry
+                     and sorted(state_entry.get('resolutions', ['hourly'])) == sorted(resolutions)
+                     and all(os.path.exists(output_path(fmt, station, 'daily')) for fmt in formats))
+        if not unchanged:
+            dropped = ingest_station_daily(station, formats)
+            if dropped is None:
+                return entry or None
+            if 'hourly' not in resolutions:
+                report_dropped(station, dropped)
+                entry = {'formats': list(formats), 'dropped': dropped}
+
+    return {**entry, 'resolutions': list(resolutions)}
+
+def ingest_stations(stations, workers=1, formats=('parquet',), state=None, resolutions=('hourly',)):
+    """
+    Обрабатывает станции последовательно или в пуле процессов.\n
+    Дочерние процессы создаются через fork и наследуют уже собранные\n
+    исходные DataFrame (sources) только для чтения, без сериализации\n
+    на каждую задачу. Ошибка по одной станции не останавливает остальные.\n
+    Возвращает словарь вида Станция:Состояние для обработанных станций\n
+    и словарь вида Станция:Ошибка для неудавшихся.
+
+    Аргументы:
+        stations (list): Имена станций.
+        workers (int): Количество процессов.
+        formats (list): Форматы выходных файлов (ключи output_writers).
+        state (dict): Состояние прошлой загрузки (для инкрементального режима).
+        resolutions (list): Разрешения выходных данных (ключи resolution_steps).
+    """
+    state = state or {}
+    results = {}
+    failed = {}
+    if workers > 1 and 'fork' not in mp.get_all_start_methods():
+        print("Параллельная обработка недоступна на этой платформе (нет fork), станции обрабатываются последовательно.")
+        workers = 1
+
+    if workers <= 1:
+        for station in stations:
+            try:
+                results[station] = ingest_station(station, formats, state.get(station), resolutions)
+            except Exception as e:
+                failed[station] = e
+        return results, failed
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork')) as pool:
+        futures = {pool.submit(ingest_station, station, formats, state.get(station), resolutions): station
+                   for station in stations}
+        for future in as_completed(futures):
+            station = futures[future]
+            try:
+                results[station] = future.result()
+            except Exception as e:
+                failed[station] = e
+    return results, failed
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Трансформация и чистка исходных данных по станциям.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Количество процессов для обработки станций (0 - по числу ядер).")
+    parser.add_argument('--formats', nargs='+', choices=list(output_writers), default=['parquet'],
+                        help="Форматы выходных файлов (по умолчанию parquet; excel - выгрузка по запросу).")
+    parser.add_argument('--resolutions', nargs='+', choices=list(resolution_steps), default=default_resolutions,
+                        help="Разрешения выходных данных (по умолчанию почасовые и суточные для прогноза).")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Обрабатывать только изменившиеся станции и дописывать только новые строки.")
+    parser.add_argument('--report', action='store_true',
+                        help="Сохранить отчёт о времени и памяти по этапам и станциям (reports/).")
+    parser.add_argument('--profile', action='store_true',
+                        help="Дополнительно сохранить профиль cProfile основного процесса (включает --report).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """Пример, как мы разбираем данные по датафрейму и имени станции"""
+    args = parse_args(argv)
+    workers = args.workers or os.cpu_count()
+    if args.report or args.profile:
+        instrument.start_run('ingest', profile=args.profile)
     try:
-        rsv_df = create_rsv_dataframe()  # Собрали DataFrame РСВ
-        hc_df = create_historical_compos_dataframe()  # Собрали DataFrame Ист. Состав
-        si_df = create_station_indicators_dataframe()  # Собрали DataFrame Показатели станций
-        tut_df = create_tut_dataframe() # Собрали DataFrame Цена т.у.т
+        # Хэши исходных книг: если ни одна не изменилась, пересобирать нечего.
+        # Изменившиеся книги конвертируются в кэш одним пулом процессов
+        manifests = ensure_cached_all(source_workbooks, workers)
+        workbook_hashes = {path: manifest['sha256'] for path, manifest in manifests.items()}
+        state = load_state(output_dir) if args.incremental else {}
+        station_states = {key: value for key, value in state.items() if key != workbooks_key}
+        if (state.get(workbooks_key) == workbook_hashes
+                and all(sorted(entry['formats']) == sorted(args.formats)
+                        and sorted(entry.get('resolutions', ['hourly'])) == sorted(args.resolutions)
+                        for entry in station_states.values())):
+            print("Исходные данные не изменились с прошлой загрузки, пересборка не требуется.")
+            if 'hourly' in args.resolutions and not rollup.cube_exists():
+                rollup.rebuild()
+                print(f"Сводный куб собран: {rollup.rollup_dir}")
+            return
+
+        for resolution in args.resolutions:
+            os.makedirs(resolution_dirs[resolution], exist_ok=True)
+
+        load_sources(workers)  # Собрали исходные DataFrame (см. source_builders)
 
         # Перечень столбцов, которые нужно извлечь
-        stations_to_extract = rsv_df.columns[rsv_df.columns != date]  # Все столбцы, кроме 'Дата'
-
-        for station in stations_to_extract:
-            dataframes = [
-                get_rsv_by_name(rsv_df, station),
-                get_hs_by_name(hc_df, station),
-                get_si_by_name(si_df, station),
-                get_tut_by_name(tut_df, station),
-                get_capacity_by_name(station),
-                get_weather_by_name(station)
-            ]
-            # Фильтруем только те датафреймы, которые не являются None и не пустые
-            dataframes = [df for df in dataframes if df is not None and not df.empty]
-
-            if dataframes:
-                try:
-                    for df in dataframes:
-                        df.set_index(date, inplace=True)
-
-                    merged_df = pd.concat(dataframes, axis=1, join='outer')
-                    merged_df.reset_index(inplace=True)
-                    merged_df.sort_values(by=date, inplace=True)
-                    merged_df.dropna(axis=1, how='all', inplace=True)
-                    merged_df.dropna(inplace=True)
-                    merged_df[multi_tut] = merged_df[total_fuel_cons] * merged_df[tut]
-
-                    file_path = os.path.join(output_dir, f"{station}.xlsx")
-                    merged_df.to_excel(file_path, index=False)
-                    print(f"Данные для '{station}' сохранены как: {file_path}")
-
-                except Exception as e:
-                    print(f"Ошибка при записи в файл информации по '{station}': {e}")
+        rsv_df = sources[src_rsv]
+        stations_to_extract = list(rsv_df.columns[rsv_df.columns != date])  # Все столбцы, кроме 'Дата'
+
+        results, failed = ingest_stations(stations_to_extract, workers, args.formats, station_states, args.resolutions)
+        if failed:
+            print(f"Не удалось обработать станции ({len(failed)} из {len(stations_to_extract)}):")
+            for station, e in failed.items():
+                print(f"  '{station}': {e}")
+
+        # Сводный куб собирается из суточных итогов станций, обновлённых выше
+        if 'hourly' in args.resolutions and results:
+            with instrument.stage('build_rollup') as record:
+                record['rows'] = sum(rollup.build_cube().values())
+            print(f"Сводный куб обновлён: {rollup.rollup_dir}")
+
+        # Сохраняем водяные знаки. Хэши книг - только если все станции обработаны,
+        # иначе следующая загрузка не должна считать данные актуальными
+        new_state = {station: entry for station, entry in results.items() if entry}
+        if not failed:
+            new_state[workbooks_key] = workbook_hashes
+        save_state(output_dir, new_state)
 
     except Exception as e:
         print(f"Общая ошибка: {e}")
+    finally:
+        instrument.finish_run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,46 @@
+import pandas as pd
+import hashlib
+import json
+import os
+
+# Имя файла с состоянием инкрементальной загрузки (в директории step2__ingest)
+state_name = "_state.json"
+
+# Ключ состояния с хэшами исходных книг
+workbooks_key = "_workbooks"
+
+
+def frame_hash(df):
+    """
+    Возвращает sha256 содержимого DataFrame (имена столбцов и значения).
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in df.columns], ensure_ascii=False).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def load_state(output_dir):
+    """
+    Читает состояние прошлой загрузки: для каждой станции - водяной знак\n
+    (последняя обработанная дата), хэши её исходных данных до водяного\n
+    знака и форматы выходных файлов; отдельно - хэши исходных книг.
+    """
+    state_path = os.path.join(output_dir, state_name)
+    if not os.path.exists(state_path):
+        return {}
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Не удалось прочитать состояние загрузки '{state_path}', будет выполнена полная пересборка: {e}")
+        return {}
+
+def save_state(output_dir, state):
+    """
+    Атомарно записывает состояние загрузки.
+    """
+    state_path = os.path.join(output_dir, state_name)
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, state_path)
@@ -0,0 +1,200 @@
+import pandas as pd
+import cProfile
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: пиковая память процесса недоступна
+    resource = None
+
+# Директория для отчётов о запусках
+reports_dir = "reports"
+
+# Переменная окружения с директорией текущего запуска (наследуется дочерними процессами)
+run_env = "PIPELINE_REPORT_DIR"
+
+# Имена аргументов, которые попадают в отчёт как станция и показатель
+label_args = {
+    'station': 'station',
+    'station_name': 'station',
+    'target_column': 'target',
+}
+
+# Профилировщик текущего запуска (только основной процесс)
+_profiler = {}
+
+
+def rss_mb():
+    """
+    Возвращает текущую память (RSS) процесса в МБ или None, если она\n
+    недоступна (есть только в Linux, /proc/self/statm).
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / (1 << 20), 1)
+
+def peak_rss_mb():
+    """
+    Возвращает пиковую память (RSS) текущего процесса за всё время его\n
+    работы в МБ или None. Это не память этапа: значение только растёт.
+    """
+    if resource is None:
+        return None
+    # В Linux ru_maxrss в КБ, в macOS - в байтах
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+def count_rows(result):
+    """
+    Возвращает количество строк результата этапа (DataFrame или словарь DataFrame).
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, dict) and result and all(isinstance(v, pd.DataFrame) for v in result.values()):
+        return sum(len(v) for v in result.values())
+    return None
+
+def start_run(name, profile=False):
+    """
+    Начинает запуск: создаёт директорию отчёта и, при необходимости,\n
+    включает cProfile. Возвращает путь к директории отчёта.
+
+    Аргументы:
+        name (str): Имя запуска (ingest, forecast).
+        profile (bool): Сохранять профиль cProfile основного процесса.
+    """
+    run_dir = os.path.join(reports_dir, f"{name}_{datetime.now():%Y%m%d_%H%M%S}")
+    os.makedirs(run_dir, exist_ok=True)
+    os.environ[run_env] = run_dir
+    if profile:
+        _profiler['profile'] = cProfile.Profile()
+        _profiler['profile'].enable()
+    return run_dir
+
+def _write_record(record):
+    """
+    Дописывает запись этапа в файл процесса (каждый процесс пишет в свой файл).
+    """
+    run_dir = os.environ.get(run_env)
+    if not run_dir:
+        return
+    with open(os.path.join(run_dir, f"stages_{os.getpid()}.jsonl"), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+@contextmanager
+def stage(name, station=None, target=None):
+    """
+    Замеряет этап: время выполнения, процессорное время, память процесса\n
+    в конце этапа и её прирост за этап (rss_mb, rss_delta_mb), пиковую\n
+    память процесса с его запуска (process_peak_rss_mb) и количество\n
+    строк. Внутри блока можно задать record['rows'] и объём памяти\n
+    результата этапа record['frame_mb'] (schema.frame_memory_mb).\n
+    Вне запуска (start_run не вызывался) запись никуда не сохраняется.
+
+    Аргументы:
+        name (str): Имя этапа.
+        station (str): Станция (необязательно).
+        target (str): Показатель (необязательно).
+    """
+    record = {'stage': name, 'station': station, 'target': target, 'rows': None, 'frame_mb': None,
+              'pid': os.getpid()}
+    rss_start = rss_mb()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    status = 'ok'
+    try:
+        yield record
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+        record['rss_mb'] = rss_mb()
+        record['rss_delta_mb'] = (round(record['rss_mb'] - rss_start, 1)
+                                  if rss_start is not None and record['rss_mb'] is not None else None)
+        record['process_peak_rss_mb'] = peak_rss_mb()
+        record['status'] = status
+        _write_record(record)
+
+def timed(name=None):
+    """
+    Декоратор: замеряет вызов функции как этап. Станция и показатель\n
+    берутся из аргументов (см. label_args), количество строк - из результата.
+
+    Аргументы:
+        name (str): Имя этапа (по умолчанию - имя функции).
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            labels = {}
+            if os.environ.get(run_env):
+                bound = signature.bind_partial(*args, **kwargs).arguments
+                labels = {label: bound[arg] for arg, label in label_args.items() if arg in bound}
+            with stage(stage_name, **labels) as record:
+                result = func(*args, **kwargs)
+                record['rows'] = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+def finish_run():
+    """
+    Завершает запуск: собирает записи всех процессов в report.json и\n
+    report.csv, сохраняет профиль (profile.prof). Возвращает DataFrame отчёта.
+    """
+    run_dir = os.environ.pop(run_env, None)
+    if not run_dir:
+        return None
+
+    profile = _profiler.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+        profile.dump_stats(os.path.join(run_dir, "profile.prof"))
+
+    records = []
+    for file_name in sorted(os.listdir(run_dir)):
+        if file_name.startswith('stages_') and file_name.endswith('.jsonl'):
+            with open(os.path.join(run_dir, file_name), encoding='utf-8') as f:
+                records.extend(json.loads(line) for line in f if line.strip())
+            os.remove(os.path.join(run_dir, file_name))
+
+    report = pd.DataFrame(records, columns=['stage', 'station', 'target', 'rows', 'frame_mb', 'wall_s', 'cpu_s',
+                                            'rss_mb', 'rss_delta_mb', 'process_peak_rss_mb', 'status', 'pid'])
+    report['rows'] = report['rows'].astype('Int64')
+    report.to_csv(os.path.join(run_dir, "report.csv"), index=False, encoding='utf-8-sig')
+
+    summary = report.groupby('stage', sort=False).agg(
+        calls=('stage', 'size'),
+        wall_s=('wall_s', 'sum'),
+        cpu_s=('cpu_s', 'sum'),
+        max_wall_s=('wall_s', 'max'),
+        rss_mb=('rss_mb', 'max'),
+        max_rss_delta_mb=('rss_delta_mb', 'max'),
+        process_peak_rss_mb=('process_peak_rss_mb', 'max'),
+        rows=('rows', 'sum'),
+        frame_mb=('frame_mb', 'sum'),
+    ).reset_index()
+    with open(os.path.join(run_dir, "report.json"), 'w', encoding='utf-8') as f:
+        json.dump({
+            'summary': json.loads(summary.to_json(orient='records')),
+            'stages': json.loads(report.to_json(orient='records')),
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"Отчёт о запуске сохранен: {run_dir}")
+    print(summary.to_string(index=False))
+    return report
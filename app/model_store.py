@@ -0,0 +1,139 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import json
+import os
+import re
+
+# Директория для обученных моделей Prophet
+models_dir = os.path.join("step3__forecast", "models")
+
+# Имя файла с перечнем сохранённых моделей по паре (станция, показатель)
+index_name = "index.json"
+
+# Сколько последних моделей хранить для каждой пары (станция, показатель)
+keep_models = 3
+
+
+def _sanitize(name):
+    return re.sub(r'[\\/:"*?<>|]+', '_', str(name))
+
+def _key_dir(station_name, target_column):
+    return os.path.join(models_dir, _sanitize(station_name), _sanitize(target_column))
+
+def series_hash(df_prophet, config=None):
+    """
+    Возвращает sha256 обучающего ряда (столбцы ds, y и внешние признаки,\n
+    если они есть) и настроек модели.
+
+    Аргументы:
+        df_prophet (pd.DataFrame): Ряд в формате Prophet (ds, y).
+        config (dict): Настройки модели, влияющие на результат обучения.
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.to_datetime(df_prophet['ds']).to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+    digest.update(df_prophet['y'].to_numpy(dtype=np.float64).tobytes())
+    for column in sorted(set(df_prophet.columns) - {'ds', 'y'}):
+        digest.update(column.encode('utf-8'))
+        digest.update(df_prophet[column].to_numpy(dtype=np.float64).tobytes())
+    if config:
+        digest.update(json.dumps(config, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+def stan_init(model):
+    """
+    Возвращает параметры обученной модели в виде начального приближения\n
+    для Stan (тёплый старт следующего обучения).
+    """
+    params = {}
+    for pname in ['k', 'm', 'sigma_obs']:
+        params[pname] = float(model.params[pname][0][0])
+    for pname in ['delta', 'beta']:
+        params[pname] = model.params[pname][0].tolist()
+    return params
+
+def _load_index(key_dir):
+    index_path = os.path.join(key_dir, index_name)
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_atomic(path, text):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def load_model(station_name, target_column, digest):
+    """
+    Возвращает сохранённую модель для точно такого же ряда и настроек\n
+    или None, если её нет.
+    """
+    key_dir = _key_dir(station_name, target_column)
+    entry = _load_index(key_dir).get(digest)
+    if entry is None:
+        return None
+    # Prophet импортируется только когда модель действительно нужна
+    from prophet.serialize import model_from_json
+    try:
+        with open(os.path.join(key_dir, entry['file']), encoding='utf-8') as f:
+            return model_from_json(f.read())
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Не удалось загрузить модель для станции '{station_name}', показателя '{target_column}': {e}")
+        return None
+
+def warm_start_params(station_name, target_column, df_prophet, config=None):
+    """
+    Ищет модель, обученную на начале текущего ряда (изменился только хвост),\n
+    и возвращает её параметры для тёплого старта или None.\n
+    Среди подходящих берётся модель с самым длинным рядом.
+    """
+    index = _load_index(_key_dir(station_name, target_column))
+    for digest, entry in sorted(index.items(), key=lambda item: item[1]['rows'], reverse=True):
+        rows = entry['rows']
+        if rows >= len(df_prophet):
+            continue
+        if series_hash(df_prophet.iloc[:rows], config) == digest:
+            # Prophet ожидает векторные параметры в виде массивов numpy
+            return {pname: np.array(value) if isinstance(value, list) else value
+                    for pname, value in entry['params'].items()}
+    return None
+
+def save_model(station_name, target_column, digest, model):
+    """
+    Сохраняет модель (model_to_json) и её параметры в хранилище.
+    """
+    from prophet.serialize import model_to_json
+
+    key_dir = _key_dir(station_name, target_column)
+    os.makedirs(key_dir, exist_ok=True)
+
+    file_name = f"{digest}.json"
+    _write_atomic(os.path.join(key_dir, file_name), model_to_json(model))
+
+    index = _load_index(key_dir)
+    # Номер сохранения: по нему определяются самые старые модели
+    saved = max((entry.get('saved', 0) for entry in index.values()), default=0) + 1
+    index[digest] = {
+        'file': file_name,
+        'rows': int(len(model.history)),
+        'last_ds': str(model.history['ds'].max()),
+        'params': stan_init(model),
+        'saved': saved,
+    }
+
+    # Удаляем самые старые модели сверх лимита (только что сохранённая остаётся всегда)
+    entries = sorted(index.items(), key=lambda item: item[1].get('saved', 0), reverse=True)
+    for old_digest, entry in entries[keep_models:]:
+        if old_digest == digest:
+            continue
+        del index[old_digest]
+        old_path = os.path.join(key_dir, entry['file'])
+        if os.path.exists(old_path):
+            os.remove(old_path)
+
+    _write_atomic(os.path.join(key_dir, index_name), json.dumps(index, ensure_ascii=False, indent=2))
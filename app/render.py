@@ -0,0 +1,75 @@
+import matplotlib
+# Неинтерактивный бэкенд: графики только сохраняются в файлы
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import model_store
+import instrument
+
+
+@instrument.timed()
+def render_plot(meta_path, plots_dir):
+    """
+    Рисует и сохраняет график прогноза по сохранённому кадру прогноза\n
+    и модели из model_store. Возвращает путь к графику.
+
+    Аргументы:
+        meta_path (str): Путь к описанию прогноза (.json рядом с .parquet).
+        plots_dir (str): Директория для графиков.
+    """
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+
+    station_name = meta['station']
+    target_column = meta['target']
+    model = model_store.load_model(station_name, target_column, meta['digest'])
+    if model is None:
+        raise ValueError(f"Модель для станции '{station_name}', показателя '{target_column}' не найдена в хранилище.")
+
+    forecast = pd.read_parquet(os.path.join(os.path.dirname(meta_path), meta['frame']))
+
+    # Построение и сохранение графика
+    fig = model.plot(forecast, figsize=(10, 6))
+    fig.gca().set_title(f'Прогноз для станции {station_name} - {target_column}')
+
+    plot_path = os.path.join(plots_dir, meta['plot'])
+    fig.savefig(plot_path)
+    plt.close(fig)
+
+    print(f"График сохранен: {plot_path}")
+    return plot_path
+
+def render_all(frames_dir, plots_dir, workers=1):
+    """
+    Рисует графики по всем сохранённым прогнозам, последовательно или\n
+    в пуле процессов. Возвращает словарь ошибок вида Описание:Ошибка.
+
+    Аргументы:
+        frames_dir (str): Директория с кадрами прогнозов.
+        plots_dir (str): Директория для графиков.
+        workers (int): Количество процессов.
+    """
+    os.makedirs(plots_dir, exist_ok=True)
+    meta_paths = sorted(glob.glob(os.path.join(frames_dir, '*.json')))
+    failed = {}
+
+    if workers <= 1:
+        for meta_path in meta_paths:
+            try:
+                render_plot(meta_path, plots_dir)
+            except Exception as e:
+                failed[meta_path] = e
+        return failed
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {meta_path: pool.submit(render_plot, meta_path, plots_dir) for meta_path in meta_paths}
+        for meta_path, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failed[meta_path] = e
+    return failed
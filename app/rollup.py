@@ -0,0 +1,220 @@
+import pandas as pd
+import numpy as np
+import argparse
+import glob
+import os
+import time
+
+# Директория сводного куба: суточные итоги каждой станции (stations) и
+# куб по уровням времени (day.parquet, month.parquet, quarter.parquet)
+rollup_dir = os.path.join("step2__ingest", "rollup")
+stations_dir = os.path.join(rollup_dir, "stations")
+
+# Меры куба: объём т.у.т., выручка РСВ в рублях (отпуск с шин в МВт·ч по
+# цене РСВ того же часа в руб./МВт·ч), стоимость т.у.т. и число часов данных
+# в периоде
+measure_columns = ['Объём т.у.т.', 'Выручка РСВ', 'Стоимость т.у.т.', 'Часов']
+
+# Отпуск с шин в ingest.py - в тыс.кВтч, цена РСВ - за МВт·ч (1 тыс.кВтч = 1 МВт·ч)
+mwh_per_thousand_kwh = 1.0
+
+# Уровни времени куба: период pandas, по началу которого группируются сутки
+levels = {
+    'day': 'D',
+    'month': 'M',
+    'quarter': 'Q',
+}
+
+# Ключи куба в порядке сортировки - по ним построен индекс
+keys = ['Период', 'Город', 'СТАНЦИЯ']
+
+# Город станций, которых нет в перечне электростанций
+unknown_city = "Не указан"
+
+# Прочитанные кубы вида Уровень:(Время изменения файла, DataFrame)
+_cubes = {}
+
+
+def _columns():
+    # Имена столбцов берутся из ingest.py. Импорт внутри функции: ingest
+    # импортирует этот модуль при загрузке
+    import ingest
+    return ingest.date, ingest.total_fuel_cons, ingest.rel_from_bus, ingest.rsv, ingest.multi_tut
+
+def _station_path(station):
+    return os.path.join(stations_dir, f"{station}.parquet")
+
+def _cube_path(level):
+    return os.path.join(rollup_dir, f"{level}.parquet")
+
+def _write_atomic(df, path):
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def station_days(df, station, city):
+    """
+    Возвращает суточные итоги мер по почасовым данным станции.
+
+    Аргументы:
+        df (pd.DataFrame): Почасовые данные станции (ingest.py).
+        station (str): Имя станции.
+        city (str): Город станции.
+    """
+    date, fuel_column, bus_column, rsv_column, cost_column = _columns()
+    bus_mwh = df[bus_column].to_numpy(dtype=np.float64) * mwh_per_thousand_kwh
+    hours = pd.DataFrame({
+        'Период': pd.DatetimeIndex(df[date]).floor('D'),
+        'Объём т.у.т.': df[fuel_column].to_numpy(dtype=np.float64),
+        'Выручка РСВ': bus_mwh * df[rsv_column].to_numpy(dtype=np.float64),
+        'Стоимость т.у.т.': df[cost_column].to_numpy(dtype=np.float64),
+        'Часов': 1,
+    })
+    days = hours.groupby('Период', sort=True).sum().reset_index()
+    days.insert(1, 'Город', city or unknown_city)
+    days.insert(2, 'СТАНЦИЯ', station)
+    return days
+
+def write_station(station, df, city):
+    """
+    Пересчитывает суточные итоги станции по всем её почасовым данным.
+    """
+    os.makedirs(stations_dir, exist_ok=True)
+    _write_atomic(station_days(df, station, city), _station_path(station))
+
+def append_station(station, new_rows, city):
+    """
+    Добавляет к суточным итогам станции только новые почасовые строки.\n
+    Сутки на границе (часть часов была раньше) суммируются с уже\n
+    сохранёнными. Возвращает False, если итогов станции ещё нет.
+    """
+    path = _station_path(station)
+    if not os.path.exists(path):
+        return False
+    days = pd.concat([pd.read_parquet(path), station_days(new_rows, station, city)], ignore_index=True)
+    days = days.groupby(keys, sort=True)[measure_columns].sum().reset_index()
+    _write_atomic(days, path)
+    return True
+
+def build_cube():
+    """
+    Собирает куб из суточных итогов всех станций: для каждого уровня\n
+    времени - суммы мер по (Период, Город, СТАНЦИЯ), отсортированные по\n
+    этим ключам. Возвращает словарь вида Уровень:Количество строк.
+    """
+    files = sorted(glob.glob(os.path.join(stations_dir, '*.parquet')))
+    if not files:
+        return {}
+    days = pd.concat([pd.read_parquet(file) for file in files], ignore_index=True)
+
+    rows = {}
+    for level, freq in levels.items():
+        cube = (days.assign(Период=days['Период'].dt.to_period(freq).dt.start_time)
+                .groupby(keys, sort=True)[measure_columns].sum()
+                .reset_index())
+        cube[['Город', 'СТАНЦИЯ']] = cube[['Город', 'СТАНЦИЯ']].astype('category')
+        _write_atomic(cube, _cube_path(level))
+        rows[level] = len(cube)
+    _cubes.clear()
+    return rows
+
+def cube_exists():
+    """
+    Проверяет, что файлы куба всех уровней есть.
+    """
+    return all(os.path.exists(_cube_path(level)) for level in levels)
+
+def load_cube(level):
+    """
+    Возвращает куб уровня level с индексом (Период, Город, СТАНЦИЯ).\n
+    Куб читается один раз и перечитывается, только если файл изменился.
+    """
+    path = _cube_path(level)
+    mtime = os.path.getmtime(path)
+    if level not in _cubes or _cubes[level][0] != mtime:
+        _cubes[level] = (mtime, pd.read_parquet(path).set_index(keys).sort_index())
+    return _cubes[level][1]
+
+def query(level='month', by=('Город',), start=None, end=None, cities=None, stations=None, measures=None):
+    """
+    Возвращает суммы мер куба за периоды с началом от start до end,\n
+    сгруппированные по ключам by. Периоды выбираются срезом\n
+    отсортированного индекса, без чтения почасовых данных. Например,\n
+    стоимость т.у.т. по городам за I квартал 2023 года:\n
+    query('quarter', ['Город'], '2023-01-01', '2023-03-31', measures=['Стоимость т.у.т.']).
+
+    Аргументы:
+        level (str): Уровень времени - 'day', 'month' или 'quarter'.
+        by (list): Ключи группировки (из 'Период', 'Город', 'СТАНЦИЯ').
+        start (str): Начало (включительно) по началу периода.
+        end (str): Конец (включительно) по началу периода.
+        cities (list): Только эти города.
+        stations (list): Только эти станции.
+        measures (list): Меры (по умолчанию - все).
+    """
+    cube = load_cube(level)
+    cube = cube.loc[pd.IndexSlice[start:end, :, :], :] if start or end else cube
+    if cities:
+        cube = cube[cube.index.get_level_values('Город').isin(cities)]
+    if stations:
+        cube = cube[cube.index.get_level_values('СТАНЦИЯ').isin(stations)]
+    columns = list(measures or measure_columns)
+    if not by:
+        return cube[columns].sum().to_frame('Итого').T
+    return cube.groupby(level=list(by), observed=True)[columns].sum()
+
+def rebuild():
+    """
+    Пересобирает итоги всех станций и куб по уже сохранённым почасовым\n
+    файлам step2__ingest (если куба нет, а данные не менялись).
+    """
+    import ingest
+
+    station_city = ingest.create_reference_data()[ingest.ref_station_city]
+    for file in sorted(glob.glob(os.path.join(ingest.resolution_dirs['hourly'], '*.parquet'))):
+        station = os.path.splitext(os.path.basename(file))[0]
+        df = pd.read_parquet(file, columns=list(_columns()))
+        write_station(station, df, station_city.get(station))
+    return build_cube()
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Запросы к сводному кубу объёма, выручки РСВ и стоимости т.у.т.")
+    parser.add_argument('--level', choices=list(levels), default='month',
+                        help="Уровень времени.")
+    parser.add_argument('--by', nargs='*', choices=keys, default=['Город'],
+                        help="Ключи группировки (без ключей - общий итог).")
+    parser.add_argument('--start', default=None,
+                        help="Начало периода (включительно), например 2023-01-01.")
+    parser.add_argument('--end', default=None,
+                        help="Конец периода (включительно), например 2023-03-31.")
+    parser.add_argument('--city', nargs='+', default=None,
+                        help="Только эти города.")
+    parser.add_argument('--station', nargs='+', default=None,
+                        help="Только эти станции.")
+    parser.add_argument('--measures', nargs='+', choices=measure_columns, default=None,
+                        help="Меры (по умолчанию - все).")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Пересобрать куб по почасовым файлам step2__ingest.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.rebuild or not cube_exists():
+        rows = rebuild()
+        if not rows:
+            print("Нет почасовых данных step2__ingest - запустите ingest.")
+            return 1
+        print("Куб собран: " + ", ".join(f"{level} - {count} строк" for level, count in rows.items()))
+
+    started = time.perf_counter()
+    result = query(args.level, args.by, args.start, args.end, args.city, args.station, args.measures)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    print(result.round(2).to_string())
+    print(f"Время запроса: {elapsed_ms:.1f} мс")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
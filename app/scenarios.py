@@ -0,0 +1,285 @@
+import pandas as pd
+import numpy as np
+import argparse
+import json
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import forecast
+import feature_store
+import ingest
+import instrument
+
+# Директория результатов сценарного прогноза
+scenarios_dir = os.path.join(forecast.output_dir, "scenarios")
+
+# Число работающих блоков (как в feature_store) и цена т.у.т. - входы сценария
+blocks_column = 'Блоков в работе'
+price_column = ingest.tut
+
+# Признаки модели сценариев: внешние признаки прогноза и состав оборудования
+scenario_regressors = feature_store.regressors + [blocks_column]
+
+# Параметры сценария: признак и действие над ним ('add' - прибавить,
+# 'mul' - умножить). Производные признаки (лаги, скользящие средние)
+# меняются так же, как исходный
+scenario_fields = {
+    'blocks': (blocks_column, 'add'),
+    'temperature': (ingest.temp_effective, 'add'),
+    'price': (price_column, 'mul'),
+}
+
+# Сценарии по умолчанию. Кроме scenario_fields, сценарий может задать
+# 'horizon' - число дней прогноза от начала периода
+default_scenarios = {
+    'базовый': {},
+    'цена +10%': {'price': 1.1},
+    'цена -10%': {'price': 0.9},
+    'блок в резерв': {'blocks': -1},
+    'дополнительный блок': {'blocks': 1},
+    'холоднее на 5 градусов': {'temperature': -5},
+}
+
+# Общие для всех задач данные: суточные данные, признаки станций, входы
+# сценариев по станциям, имена и горизонты сценариев. Заполняются в
+# run_scenarios() до запуска пула процессов и наследуются при fork
+shared = {}
+
+
+def load_scenarios(path=None):
+    """
+    Возвращает сценарии из файла JSON вида {"Имя": {"price": 1.1, ...}}\n
+    или сценарии по умолчанию. Неизвестные параметры - ошибка.
+    """
+    if path is None:
+        return default_scenarios
+    with open(path, encoding='utf-8') as f:
+        specs = json.load(f)
+    for name, spec in specs.items():
+        unknown = set(spec) - set(scenario_fields) - {'horizon'}
+        if unknown:
+            raise ValueError(f"Сценарий '{name}': неизвестные параметры {sorted(unknown)}. "
+                             f"Доступны: {sorted(scenario_fields) + ['horizon']}.")
+    return specs
+
+def load_forecast_inputs():
+    """
+    Читает книги "Состав на прогноз" и "Цена т.у.т. на прогноз" через\n
+    кэш книг (excel_cache) теми же преобразованиями, что и ingest.\n
+    Возвращает части состава по станциям и помесячные цены.
+    """
+    with instrument.stage('load_forecast_inputs'):
+        return ingest.create_composition_forecast_partitions(), ingest.create_tut_forecast_dataframe()
+
+def station_inputs(station_name, features, composition, tut_forecast, dates):
+    """
+    Возвращает базовые входы сценариев станции на даты dates (DataFrame\n
+    с индексом по датам): признаки модели и цену т.у.т. Состав и цена\n
+    берутся из книг на прогноз, а даты, которых в книгах нет, - из\n
+    хранилища признаков (среднее по дню года и последняя цена).
+
+    Аргументы:
+        station_name (str): Имя станции.
+        features (pd.DataFrame): Признаки станции из feature_store.
+        composition (dict): Части состава из create_composition_forecast_partitions().
+        tut_forecast (pd.DataFrame): Цены из create_tut_forecast_dataframe().
+        dates (pd.DatetimeIndex): Даты прогноза.
+    """
+    columns = [col for col in scenario_regressors if features[col].notna().all()] + [price_column]
+    base = features.set_index('Дата')[columns].reindex(dates).astype('float64')
+
+    if ingest.normalize_column_name(station_name) in composition:
+        blocks = ingest.get_hs_by_name(composition, station_name, 'D')
+        in_operation = blocks.set_index(ingest.date)[ingest.block_columns].sum(axis=1) / ingest.steps_per_day('h')
+        base[blocks_column] = in_operation.reindex(dates).fillna(base[blocks_column])
+
+    prices = ingest.get_tut_by_name(tut_forecast, station_name, 'D') if ingest.find_station_column(tut_forecast, station_name) else None
+    if prices is not None:
+        base[price_column] = prices.set_index(ingest.date)[price_column].reindex(dates).fillna(base[price_column])
+    return base
+
+def scenario_inputs(base, specs):
+    """
+    Строит входы всех сценариев станции одним массивом (сценарий x день x\n
+    признак) без циклов по дням: base * множители + слагаемые сценария.
+
+    Аргументы:
+        base (pd.DataFrame): Базовые входы станции (station_inputs()).
+        specs (list): Параметры сценариев.
+    """
+    multipliers = np.ones((len(specs), base.shape[1]))
+    additions = np.zeros((len(specs), base.shape[1]))
+    for i, spec in enumerate(specs):
+        for field, value in spec.items():
+            if field not in scenario_fields:
+                continue
+            column, action = scenario_fields[field]
+            affected = [j for j, col in enumerate(base.columns) if col == column or col.startswith(column + ' (')]
+            if action == 'mul':
+                multipliers[i, affected] *= value
+            else:
+                additions[i, affected] += value
+
+    inputs = base.to_numpy()[None, :, :] * multipliers[:, None, :] + additions[:, None, :]
+    if blocks_column in base.columns:
+        j = base.columns.get_loc(blocks_column)
+        inputs[:, :, j] = inputs[:, :, j].clip(0, len(ingest.block_columns))
+    return inputs
+
+def predict_scenarios(model, base, inputs):
+    """
+    Прогнозирует все сценарии одним вызовом predict: модель предсказывает\n
+    базовые входы, а отклонение сценария добавляется через коэффициенты\n
+    аддитивных признаков (yhat сценария = yhat базы + (x - x базы) * coef).\n
+    Возвращает массив сценарий x день.
+    """
+    from prophet.utilities import regressor_coefficients
+
+    coefficients = regressor_coefficients(model).set_index('regressor')['coef']
+    future = base[coefficients.index].rename_axis('ds').reset_index()
+    base_yhat = model.predict(future)['yhat'].to_numpy()
+
+    idx = [base.columns.get_loc(col) for col in coefficients.index]
+    delta = inputs[:, :, idx] - base.to_numpy()[None, :, idx]
+    return (base_yhat[None, :] + delta @ coefficients.to_numpy()).clip(min=0)
+
+def scenario_task(station_name, target_column, use_cache=True):
+    """
+    Обучает (или берёт из хранилища) модель пары со сценарными признаками\n
+    и возвращает объём и стоимость т.у.т. по всем сценариям.
+    """
+    features = shared['features'][station_name]
+    base, inputs = shared['inputs'][station_name]
+    df_prophet = forecast.station_series(shared['data_daily'], station_name, target_column,
+                                         features, scenario_regressors)
+    model, _ = forecast.fit_station_model(df_prophet, station_name, target_column, use_cache)
+
+    with instrument.stage('predict_scenarios', station=station_name, target=target_column) as record:
+        volume = predict_scenarios(model, base, inputs)
+        record['rows'] = volume.size
+
+    price = inputs[:, :, base.columns.get_loc(price_column)]
+    names = shared['names']
+    result = pd.DataFrame({
+        'Сценарий': np.repeat(names, len(base)),
+        'СТАНЦИЯ': station_name,
+        'Показатель': target_column,
+        'дата': np.tile(base.index.to_numpy(), len(names)),
+        'Объём т.у.т.': volume.ravel(),
+        price_column: price.ravel(),
+        'Стоимость т.у.т.': (volume * price).ravel(),
+    })
+    # Дни за горизонтом сценария не выводятся
+    day = np.tile(np.arange(len(base)), len(names))
+    return result[day < np.repeat(shared['horizons'], len(base))]
+
+def run_scenarios(data_daily, stations, targets, specs, start, end, workers=1, use_cache=True):
+    """
+    Строит прогноз по всем сценариям для всех пар (станция, показатель).\n
+    На каждую пару - одно обучение (или модель из хранилища) и один\n
+    predict для всех сценариев. Возвращает DataFrame прогнозов и словарь\n
+    ошибок вида (Станция, Показатель):Ошибка.
+
+    Аргументы:
+        data_daily (pd.DataFrame): Суточные данные всех станций.
+        stations (list): Имена станций.
+        targets (list): Прогнозируемые показатели.
+        specs (dict): Сценарии вида Имя:Параметры.
+        start (str): Начало периода прогноза.
+        end (str): Конец периода прогноза.
+        workers (int): Количество процессов.
+        use_cache (bool): Использовать сохранённые модели (model_store).
+    """
+    dates = pd.date_range(start, end, freq='D')
+    composition, tut_forecast = load_forecast_inputs()
+
+    shared['data_daily'] = data_daily
+    shared['features'] = feature_store.load_all(stations, end)
+    shared['names'] = list(specs)
+    shared['horizons'] = np.array([spec.get('horizon', len(dates)) for spec in specs.values()])
+    shared['inputs'] = {}
+    for station_name in shared['features']:
+        base = station_inputs(station_name, shared['features'][station_name], composition, tut_forecast, dates)
+        shared['inputs'][station_name] = (base, scenario_inputs(base, list(specs.values())))
+
+    tasks = [(station, target) for station in stations if station in shared['inputs'] for target in targets]
+    if workers > 1 and 'fork' not in mp.get_all_start_methods():
+        print("Параллельное обучение недоступно на этой платформе (нет fork), модели обучаются последовательно.")
+        workers = 1
+
+    results = []
+    failed = {}
+    if workers <= 1:
+        for station, target in tasks:
+            try:
+                results.append(scenario_task(station, target, use_cache))
+            except Exception as e:
+                failed[(station, target)] = e
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context('fork')) as pool:
+            futures = {task: pool.submit(scenario_task, *task, use_cache) for task in tasks}
+            for task, future in futures.items():
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    failed[task] = e
+    return (pd.concat(results, ignore_index=True) if results else pd.DataFrame()), failed
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Сценарный прогноз объёма и стоимости т.у.т. по книгам на прогноз.")
+    parser.add_argument('--scenarios', default=None,
+                        help=f"Файл JSON со сценариями вида {{\"Имя\": {{\"price\": 1.1, \"blocks\": -1, "
+                             f"\"temperature\": -5, \"horizon\": 90}}}} (по умолчанию - встроенные сценарии).")
+    parser.add_argument('--start', default=forecast.forecast_start,
+                        help="Начало периода прогноза.")
+    parser.add_argument('--end', default=forecast.forecast_end,
+                        help="Конец периода прогноза.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Количество процессов для обучения моделей (0 - по числу ядер).")
+    parser.add_argument('--no-model-cache', action='store_true',
+                        help="Обучать все модели заново, не используя сохранённые.")
+    parser.add_argument('--report', action='store_true',
+                        help="Сохранить отчёт о времени и памяти по этапам (reports/).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        specs = load_scenarios(args.scenarios)
+    except (OSError, ValueError) as e:
+        print(f"Ошибка чтения сценариев: {e}")
+        return 1
+    if args.report:
+        instrument.start_run('scenarios')
+    try:
+        data_daily = forecast.load_daily_data(forecast.input_dir, forecast.targets)
+        stations = data_daily['СТАНЦИЯ'].unique()
+        result, failed = run_scenarios(data_daily, stations, forecast.targets, specs, args.start, args.end,
+                                       args.workers or os.cpu_count(), use_cache=not args.no_model_cache)
+        for (station, target), e in failed.items():
+            print(f"Ошибка сценарного прогноза для станции '{station}', показателя '{target}': {e}")
+        if result.empty:
+            print("Нет сценарных прогнозов, файлы не сохранены.")
+            return 1
+
+        os.makedirs(scenarios_dir, exist_ok=True)
+        filename = os.path.join(scenarios_dir, 'сценарии.csv')
+        result.to_csv(filename, index=False, encoding='utf-8-sig')
+
+        summary = (result.groupby(['Сценарий', 'СТАНЦИЯ', 'Показатель'], sort=False)[['Объём т.у.т.', 'Стоимость т.у.т.']]
+                   .sum().reset_index())
+        summary_file = os.path.join(scenarios_dir, 'сценарии_итоги.csv')
+        summary.to_csv(summary_file, index=False, encoding='utf-8-sig')
+
+        totals = summary[summary['Показатель'] == ingest.total_fuel_cons]
+        print(totals.groupby('Сценарий', sort=False)[['Объём т.у.т.', 'Стоимость т.у.т.']].sum().round(0).to_string())
+        print(f"Результаты сохранены: {filename}, {summary_file}")
+        return 1 if failed else 0
+    finally:
+        instrument.finish_run()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+import pandas as pd
+import numpy as np
+
+# Состояние блоков: 1 - в работе, 0 - нет ('-' в исходных книгах)
+block_dtype = 'int8'
+
+# Цены, мощности и погода: 1-2 знака после запятой, float32 хватает
+compact_float_dtype = 'float32'
+
+# Показатели станций (цели прогноза) и производные от них - без потери точности
+float_dtype = 'float64'
+
+# Время - наносекунды без часового пояса, шаг один час
+date_dtype = 'datetime64[ns]'
+
+
+def parse_numeric(values, dtype=float_dtype):
+    """
+    Преобразует столбец в числа одним векторным проходом.\n
+    Числа остаются как есть, строки чистятся от пробелов (в т.ч.\n
+    неразрывных) и запятой в качестве разделителя. Нечисловая строка\n
+    вызывает ошибку, пустые значения остаются NaN.
+
+    Аргументы:
+        values (pd.Series): Столбец с числами и/или строками.
+        dtype (str): Тип результата.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(dtype)
+
+    numbers = pd.to_numeric(values, errors='coerce')
+    text_mask = (numbers.isna() & values.notna()).to_numpy()
+    if text_mask.any():
+        text = values[text_mask].astype(str)
+        cleaned = text.str.replace(r'[\s\xa0]', '', regex=True).str.replace(',', '.', regex=False)
+        parsed = np.asarray(pd.to_numeric(cleaned), dtype=np.float64)
+        numbers = numbers.to_numpy(dtype=np.float64, copy=True)
+        numbers[text_mask] = parsed
+        numbers = pd.Series(numbers, index=values.index, name=values.name)
+    return numbers.astype(dtype)
+
+def block_state(values):
+    """
+    Преобразует состояние блока (1 или '-') в int8: 1 - в работе, 0 - нет.
+    """
+    if values.dtype == block_dtype:
+        return values
+    if pd.api.types.is_numeric_dtype(values):
+        return values.fillna(0).astype(block_dtype)
+    # Различных значений единицы ('-', 1, '1') - разбираем только их
+    uniques = values.dropna().unique()
+    states = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').fillna(0).astype(block_dtype)
+    return values.map(dict(zip(uniques, states))).fillna(0).astype(block_dtype)
+
+def category_key(values):
+    """
+    Преобразует ключ (станция, город) в категориальный столбец.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    return values.astype('category')
+
+def apply_schema(df, blocks=(), compact=(), compact_prefixes=(), keys=(), dates=()):
+    """
+    Приводит столбцы DataFrame к компактным типам (на месте) и возвращает его.\n
+    Отсутствующие в DataFrame столбцы пропускаются, повторный вызов\n
+    ничего не меняет.
+
+    Аргументы:
+        df (pd.DataFrame): DataFrame для приведения.
+        blocks (list): Столбцы состояния блоков (int8).
+        compact (list): Числовые столбцы с малой точностью (float32).
+        compact_prefixes (list): Префиксы имён столбцов с малой точностью\n
+            (для столбцов, имена которых зависят от данных).
+        keys (list): Ключи - станции, города (category).
+        dates (list): Столбцы дат (datetime64).
+    """
+    for col in df.columns:
+        if col in blocks:
+            df[col] = block_state(df[col])
+        elif col in compact or (isinstance(col, str) and col.startswith(tuple(compact_prefixes))):
+            df[col] = parse_numeric(df[col], compact_float_dtype)
+        elif col in keys:
+            df[col] = category_key(df[col])
+        elif col in dates and df[col].dtype != date_dtype:
+            df[col] = pd.to_datetime(df[col]).astype(date_dtype)
+    return df
+
+def frame_memory_mb(df):
+    """
+    Возвращает объём памяти DataFrame в МБ (с учётом строк в object-столбцах).
+    """
+    return round(df.memory_usage(deep=True).sum() / (1 << 20), 2)
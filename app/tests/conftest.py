@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули приложения лежат в app/ и импортируются по имени (как при запуске из app/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
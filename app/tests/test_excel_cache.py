@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+import excel_cache
+
+
+# Смешанный столбец: текст, похожий на числа, числа, даты, логические значения и пропуски
+mixed_cells = ["007", 7, "nan", 1.5, "inf", "1_000", " 12 ", datetime(2023, 1, 2, 3, 4, 5),
+               True, None, "-", 1, 0.1, "True", datetime(2022, 12, 31)]
+
+
+@pytest.fixture
+def workbook(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.title = "Лист"
+    sheet.append(["Дата", "Смешанный", 5, "Число"])
+    for idx, value in enumerate(mixed_cells):
+        sheet.append([datetime(2023, 1, 1 + idx), value, "-" if idx % 3 else idx, idx * 1.5])
+    book.create_sheet("Второй").append(["a"])
+    path = "книга.xlsx"
+    book.save(path)
+    return path
+
+
+def assert_same(cached, expected):
+    pd.testing.assert_frame_equal(cached, expected)
+    # assert_frame_equal считает равными 1, 1.0 и True - типы сверяются отдельно
+    for col in expected.columns:
+        assert [type(value) for value in cached[col]] == [type(value) for value in expected[col]], col
+
+
+def test_read_excel_matches_pandas(workbook):
+    assert excel_cache.sheet_names(workbook) == ["Лист", "Второй"]
+    assert_same(excel_cache.read_excel(workbook, "Лист"), pd.read_excel(workbook, sheet_name="Лист"))
+
+
+def test_read_excel_columns_and_chunks(workbook):
+    expected = pd.read_excel(workbook, sheet_name=0)
+    assert_same(excel_cache.read_excel(workbook, 0, columns=["Смешанный", 5]), expected[["Смешанный", 5]])
+
+    chunks = list(excel_cache.iter_excel(workbook, 0, chunk_rows=4))
+    assert len(chunks) == 4
+    assert_same(pd.concat(chunks, ignore_index=True), expected)
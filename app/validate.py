@@ -0,0 +1,117 @@
+import pyarrow.parquet as pq
+import argparse
+import glob
+import os
+from excel_cache import cache_status
+import ingest
+import forecast
+
+# Книги, нужные только для прогноза по сценариям: их отсутствие - предупреждение
+optional_workbooks = [ingest.composition_forecast, ingest.price_tut_forecast]
+
+
+def date_range(metadata, column=ingest.date):
+    """
+    Возвращает первую и последнюю дату файла Parquet по статистике\n
+    групп строк (без чтения данных) или (None, None).
+    """
+    index = metadata.schema.to_arrow_schema().get_field_index(column)
+    if index < 0:
+        return None, None
+    starts, ends = [], []
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(index).statistics
+        if stats is None or not stats.has_min_max:
+            return None, None
+        starts.append(stats.min)
+        ends.append(stats.max)
+    return (min(starts), max(ends)) if starts else (None, None)
+
+def check_sources():
+    """
+    Проверяет исходные книги и их кэш. Возвращает списки ошибок и предупреждений.
+    """
+    errors, warnings = [], []
+    for path in ingest.source_workbooks + optional_workbooks:
+        if not os.path.exists(path):
+            problems = warnings if path in optional_workbooks else errors
+            problems.append(f"Нет исходной книги: {path}")
+            continue
+        status = cache_status(path)
+        if status != 'fresh':
+            warnings.append(f"Кэш книги {path}: {'нет' if status == 'missing' else 'устарел'} "
+                            f"(будет собран при первом чтении книги)")
+    return errors, warnings
+
+def check_station_files():
+    """
+    Проверяет файлы станций step2__ingest по метаданным Parquet:\n
+    количество строк, период, наличие прогнозируемых показателей и\n
+    суточных данных. Возвращает строки отчёта, ошибки и предупреждения.
+    """
+    errors, warnings, lines = [], [], []
+    hourly_files = sorted(glob.glob(os.path.join(ingest.resolution_dirs['hourly'], '*.parquet')))
+    daily_files = sorted(glob.glob(os.path.join(ingest.resolution_dirs['daily'], '*.parquet')))
+    if not hourly_files and not daily_files:
+        errors.append(f"Нет данных в {ingest.output_dir} - запустите ingest.")
+        return lines, errors, warnings
+
+    stations = sorted({os.path.splitext(os.path.basename(file))[0] for file in hourly_files + daily_files})
+    for station in stations:
+        counts = {}
+        for resolution in ingest.resolution_dirs:
+            file_path = ingest.output_path('parquet', station, resolution)
+            if not os.path.exists(file_path):
+                continue
+            try:
+                metadata = pq.read_metadata(file_path)
+            except Exception as e:
+                errors.append(f"'{station}': не удалось прочитать {file_path}: {e}")
+                continue
+
+            columns = {name.replace('/', '_') for name in metadata.schema.names}
+            missing = [target for target in forecast.targets if target not in columns]
+            if missing:
+                errors.append(f"'{station}' ({resolution}): нет показателей {missing}")
+            if metadata.num_rows == 0:
+                errors.append(f"'{station}' ({resolution}): нет строк")
+            start, end = date_range(metadata)
+            counts[resolution] = f"{metadata.num_rows} строк" + (f" с {start:%Y-%m-%d} по {end:%Y-%m-%d}" if start else "")
+
+        if 'daily' not in counts:
+            warnings.append(f"'{station}': нет суточных данных, прогноз будет суммировать почасовые")
+        lines.append(f"{station}: " + "; ".join(f"{resolution} - {text}" for resolution, text in counts.items()))
+    return lines, errors, warnings
+
+def parse_args(argv=None):
+    """
+    Разбирает аргументы командной строки.
+    """
+    parser = argparse.ArgumentParser(description="Проверка исходных книг и данных step2__ingest без их загрузки.")
+    parser.add_argument('--strict', action='store_true',
+                        help="Считать предупреждения ошибками (код выхода 1).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    """
+    Печатает отчёт о проверке и возвращает код выхода (0 - ошибок нет).
+    """
+    args = parse_args(argv)
+    source_errors, source_warnings = check_sources()
+    lines, station_errors, station_warnings = check_station_files()
+    errors = source_errors + station_errors
+    warnings = source_warnings + station_warnings
+
+    for line in lines:
+        print(line)
+    for warning in warnings:
+        print(f"Предупреждение: {warning}")
+    for error in errors:
+        print(f"Ошибка: {error}")
+
+    failed = bool(errors) or (args.strict and bool(warnings))
+    print("Проверка не пройдена." if failed else "Проверка пройдена.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())